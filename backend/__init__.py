@@ -0,0 +1,10 @@
+from ._backend import BACKENDS, HAS_NUMBA, get_backend, set_backend, Kernel, kernel
+
+__all__ = [
+    "BACKENDS",
+    "HAS_NUMBA",
+    "get_backend",
+    "set_backend",
+    "Kernel",
+    "kernel",
+]
@@ -0,0 +1,57 @@
+from importlib import import_module
+from importlib.util import find_spec
+
+BACKENDS = ("python", "numba")
+
+# numba is only imported when a kernel is first compiled
+HAS_NUMBA = find_spec("numba") is not None
+
+_backend = "numba" if HAS_NUMBA else "python"
+
+
+def _check_backend(backend):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}, expected one of {BACKENDS}")
+    if backend == "numba" and not HAS_NUMBA:
+        raise ImportError("The numba backend requires numba to be installed")
+    return backend
+
+
+def get_backend():
+    return _backend
+
+
+def set_backend(backend):
+    global _backend
+    _backend = _check_backend(backend)
+
+
+# Pure Python loop compiled with numba on first use of that backend. Kernels
+# only take scalars and NumPy arrays so the same source runs on both backends.
+class Kernel:
+    def __init__(self, func):
+        self.func = func
+        self.python_func = func
+        self._compiled = None
+
+    def python(self, func):
+        # Registers a vectorized NumPy equivalent to run on the python backend
+        # instead of the loop
+        self.python_func = func
+        return func
+
+    def get(self, backend=None):
+        backend = _backend if backend is None else _check_backend(backend)
+        if backend == "python":
+            return self.python_func
+
+        if self._compiled is None:
+            self._compiled = import_module("numba").njit(cache=True)(self.func)
+        return self._compiled
+
+    def __call__(self, *args, backend=None):
+        return self.get(backend)(*args)
+
+
+def kernel(func):
+    return Kernel(func)
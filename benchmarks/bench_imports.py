@@ -0,0 +1,15 @@
+# Run with: python -m pytest benchmarks/bench_imports.py
+import os
+from tests.test_imports import probe_imports
+
+# Seconds for import breathmetrics, and for the pipeline behind it
+IMPORT_BUDGET = float(os.environ.get("BENCH_IMPORT_BUDGET", 0.05))
+PIPELINE_BUDGET = float(os.environ.get("BENCH_PIPELINE_BUDGET", 1.0))
+
+
+def test__import_time():
+    assert probe_imports()["import_time"] < IMPORT_BUDGET
+
+
+def test__pipeline_import_time():
+    assert probe_imports()["pipeline_time"] < PIPELINE_BUDGET
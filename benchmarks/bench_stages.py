@@ -0,0 +1,96 @@
+# Run with: python -m pytest benchmarks/bench_stages.py
+# BENCH_LENGTHS selects the recording durations, e.g. BENCH_LENGTHS=1min,1h,24h
+import os
+from functools import lru_cache
+import pytest
+from synthetic import LENGTHS, synthetic_breathing
+from preprocess import mean_smooth, remove_global_drift, z_score
+from preprocess._preprocess import find_local_drift
+from extrema_detection import find_potential_extrema, pwct, find_corrected_extrema
+from onset_offset_detection import find_onsets, find_offsets
+from metrics import find_volumes, summarize
+from pipeline._pipeline import find_breaths
+
+SR = 100
+BENCH_LENGTHS = os.environ.get("BENCH_LENGTHS", "1min,10min").split(",")
+
+
+# Module scoped so the tests of one length run together and share its stages
+@pytest.fixture(scope="module", params=BENCH_LENGTHS)
+def length(request):
+    return request.param
+
+
+@lru_cache(maxsize=1)
+def stages(length):
+    # Inputs of every stage, computed once per length
+    y = synthetic_breathing(LENGTHS[length], SR)
+    smoothed = mean_smooth(y, SR, mode="same")
+    detrended = remove_global_drift(smoothed)
+    normalized = z_score(detrended)
+    potential_extrema = find_potential_extrema(normalized, SR)
+    voted = pwct(*potential_extrema)
+    extrema = find_corrected_extrema(normalized, *voted)
+    onsets = find_onsets(normalized, *extrema)
+    offsets = find_offsets(normalized, *onsets)
+
+    return {
+        "y": y,
+        "detrended": detrended,
+        "normalized": normalized,
+        "potential_extrema": potential_extrema,
+        "voted": voted,
+        "extrema": extrema,
+        "onsets": onsets,
+        "offsets": offsets,
+    }
+
+
+def metrics(detrended, extrema, onsets, offsets):
+    inhale_onsets, exhale_onsets, _, _ = onsets
+    volumes = find_volumes(
+        detrended, SR, inhale_onsets, offsets[0], exhale_onsets, offsets[1]
+    )
+    return summarize(find_breaths(SR, *extrema, *onsets, *offsets, *volumes))
+
+
+def test__mean_smooth(check_baseline, length):
+    check_baseline(mean_smooth, stages(length)["y"], SR, mode="same")
+
+
+def test__find_local_drift(check_baseline, length):
+    check_baseline(find_local_drift, stages(length)["y"], SR, 60)
+
+
+def test__find_potential_extrema(check_baseline, length):
+    check_baseline(find_potential_extrema, stages(length)["normalized"], SR)
+
+
+def test__pwct(check_baseline, length):
+    check_baseline(pwct, *stages(length)["potential_extrema"])
+
+
+def test__find_corrected_extrema(check_baseline, length):
+    inputs = stages(length)
+    check_baseline(find_corrected_extrema, inputs["normalized"], *inputs["voted"])
+
+
+def test__find_onsets(check_baseline, length):
+    inputs = stages(length)
+    check_baseline(find_onsets, inputs["normalized"], *inputs["extrema"])
+
+
+def test__find_offsets(check_baseline, length):
+    inputs = stages(length)
+    check_baseline(find_offsets, inputs["normalized"], *inputs["onsets"])
+
+
+def test__metrics(check_baseline, length):
+    inputs = stages(length)
+    check_baseline(
+        metrics,
+        inputs["detrended"],
+        inputs["extrema"],
+        inputs["onsets"],
+        inputs["offsets"],
+    )
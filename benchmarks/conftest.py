@@ -0,0 +1,73 @@
+import json
+import os
+import tracemalloc
+import pytest
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+# Slowdown factors over the baseline that fail a benchmark
+TIME_TOLERANCE = float(os.environ.get("BENCH_TIME_TOLERANCE", 2.0))
+MEMORY_TOLERANCE = float(os.environ.get("BENCH_MEMORY_TOLERANCE", 1.2))
+
+# Set to 1 to record the results of the run as the new baseline
+UPDATE_BASELINE = os.environ.get("BENCH_UPDATE_BASELINE") == "1"
+
+
+def peak_memory(function, *args, **kwargs):
+    # Peak of the memory allocated by one call, NumPy arrays included
+    tracemalloc.start()
+    try:
+        function(*args, **kwargs)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+@pytest.fixture(scope="session")
+def baseline():
+    results = {}
+    if os.path.exists(BASELINE):
+        with open(BASELINE) as file:
+            results = json.load(file)
+
+    yield results
+
+    if UPDATE_BASELINE:
+        with open(BASELINE, "w") as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+            file.write("\n")
+
+
+@pytest.fixture
+def check_baseline(request, benchmark, baseline):
+    # Times function with pytest-benchmark, measures its peak memory and
+    # compares both with the baseline entry of the test
+    def check(function, *args, **kwargs):
+        result = benchmark(function, *args, **kwargs)
+        peak = peak_memory(function, *args, **kwargs)
+        benchmark.extra_info["peak_memory"] = peak
+
+        if benchmark.disabled:
+            return result
+
+        seconds = benchmark.stats.stats.min
+        name = request.node.name
+        if UPDATE_BASELINE:
+            baseline[name] = {"min_s": seconds, "peak_bytes": peak}
+            return result
+
+        if name not in baseline:
+            pytest.skip(f"No baseline for {name}, run with BENCH_UPDATE_BASELINE=1")
+
+        expected = baseline[name]
+        assert seconds <= expected["min_s"] * TIME_TOLERANCE, (
+            f"{name} took {seconds:.4f} s, "
+            f"over {TIME_TOLERANCE} times the baseline {expected['min_s']:.4f} s"
+        )
+        assert peak <= expected["peak_bytes"] * MEMORY_TOLERANCE, (
+            f"{name} peaked at {peak} bytes, "
+            f"over {MEMORY_TOLERANCE} times the baseline {expected['peak_bytes']}"
+        )
+        return result
+
+    return check
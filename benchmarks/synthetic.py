@@ -0,0 +1,46 @@
+import numpy as np
+
+# Durations of the benchmarked recordings
+LENGTHS = {"1min": 60, "10min": 600, "1h": 3600, "24h": 86400}  # s
+
+
+def synthetic_breathing(
+    duration,
+    sr=100,
+    rate=15,
+    rate_var=0.15,
+    pause_prob=0.3,
+    noise=0.05,
+    drift=1.0,
+    seed=0,
+):
+    # Deterministic respiration signal of duration seconds: sine breaths at
+    # about rate breaths per minute with a log-normal spread of rate_var, a flat
+    # pause after a pause_prob fraction of them, white noise of std noise and a
+    # drift made of a slope and a slow oscillation, both of amplitude drift
+    rng = np.random.default_rng(seed)
+    n_samples = int(duration * sr)
+
+    # Enough breaths to cover the duration even when they all come out short
+    n_breaths = int(duration * rate / 60 * 2) + 2
+    breath_lengths = np.maximum(
+        (60 / rate * sr * rng.lognormal(0, rate_var, n_breaths)).astype(np.int64), 2
+    )
+    pause_lengths = np.where(
+        rng.random(n_breaths) < pause_prob,
+        (rng.uniform(0.2, 0.5, n_breaths) * breath_lengths).astype(np.int64),
+        0,
+    )
+    amplitudes = rng.uniform(0.8, 1.2, n_breaths)
+    starts = np.concatenate(([0], np.cumsum(breath_lengths + pause_lengths)[:-1]))
+
+    # Breath of every sample and its phase, past 1 within the following pause
+    t = np.arange(n_samples)
+    breath = np.searchsorted(starts, t, "right") - 1
+    phase = (t - starts[breath]) / breath_lengths[breath]
+    y = np.where(phase < 1, np.sin(2 * np.pi * phase), 0.0) * amplitudes[breath]
+
+    y += rng.normal(0, noise, n_samples)
+    y += drift * (t / max(n_samples, 1) + np.sin(2 * np.pi * t / (600 * sr)))
+
+    return y
@@ -0,0 +1,56 @@
+from importlib import import_module
+
+# Public names and the module they come from. Modules are only imported when a
+# name is first looked up (PEP 562), so importing the package stays cheap
+_ATTRIBUTES = {
+    "BreathMetrics": "pipeline",
+    "process_signals": "pipeline",
+    "process_chunked": "pipeline",
+    "StreamingBreathDetector": "pipeline",
+    "DiskCache": "pipeline",
+    "BreathTable": "metrics",
+    "MetricsSummary": "metrics",
+    "summarize": "metrics",
+    "find_rolling_metrics": "metrics",
+    "ExtremaSweep": "extrema_detection",
+    "sweep_votes": "extrema_detection",
+    "load_signal": "signal_io",
+    "scratch_array": "signal_io",
+    "collect": "instrumentation",
+    "get_backend": "backend",
+    "set_backend": "backend",
+    "RECORDING_SUFFIXES": "breathmetrics._runner",
+    "OUTPUT_FIELDS": "breathmetrics._runner",
+    "find_recordings": "breathmetrics._runner",
+    "run_batch": "breathmetrics._runner",
+    "main": "breathmetrics._cli",
+}
+_SUBMODULES = (
+    "preprocess",
+    "extrema_detection",
+    "onset_offset_detection",
+    "metrics",
+    "pipeline",
+    "signal_io",
+    "instrumentation",
+    "backend",
+)
+
+__all__ = list(_ATTRIBUTES) + list(_SUBMODULES)
+
+
+def __getattr__(name):
+    if name in _ATTRIBUTES:
+        value = getattr(import_module(_ATTRIBUTES[name]), name)
+    elif name in _SUBMODULES:
+        value = import_module(name)
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    # Later lookups skip __getattr__
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
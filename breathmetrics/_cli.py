@@ -0,0 +1,71 @@
+import argparse
+import logging
+import numpy as np
+from ._runner import run_batch
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="breathmetrics",
+        description="Detect breaths and compute their metrics on a batch of "
+        "recordings",
+    )
+    parser.add_argument(
+        "recordings", help="directory of .npy/.csv/raw recordings, or a glob pattern"
+    )
+    parser.add_argument(
+        "-o", "--output", required=True, help="metrics of every file, .csv or .npz"
+    )
+    parser.add_argument("--sr", type=float, required=True, help="sampling rate (Hz)")
+    parser.add_argument(
+        "-j", "--workers", type=int, default=None, help="number of processes"
+    )
+    parser.add_argument(
+        "--chunksize", type=int, default=1, help="files sent to a process at once"
+    )
+    parser.add_argument("--raw-dtype", default=None, help="dtype of raw recordings")
+    parser.add_argument("--breaths-dir", default=None, help="saves breath tables")
+    parser.add_argument("--smooth-window-ms", type=float)
+    parser.add_argument("--drift-order", type=int)
+    parser.add_argument("--window-sizes-ms", type=float, nargs="+")
+    parser.add_argument("--shift", type=int)
+    parser.add_argument("--dtype", choices=["float32", "float64"])
+    parser.add_argument(
+        "--decimate-sr", type=float, help="detects breaths at this rate (Hz)"
+    )
+    parser.add_argument("-q", "--quiet", action="store_true")
+
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(
+        level=logging.WARNING if args.quiet else logging.INFO, format="%(message)s"
+    )
+
+    # Pipeline parameters left out keep their defaults
+    params = {
+        name: getattr(args, name)
+        for name in [
+            "smooth_window_ms",
+            "drift_order",
+            "window_sizes_ms",
+            "shift",
+            "dtype",
+            "decimate_sr",
+        ]
+        if getattr(args, name) is not None
+    }
+    _, _, n_failed = run_batch(
+        args.recordings,
+        args.output,
+        args.sr,
+        args.workers,
+        args.chunksize,
+        None if args.raw_dtype is None else np.dtype(args.raw_dtype),
+        args.breaths_dir,
+        **params,
+    )
+
+    return 1 if n_failed else 0
@@ -0,0 +1,210 @@
+import csv
+import glob
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from signal_io import load_signal
+from metrics import MetricsSummary
+from pipeline import BreathMetrics
+
+RECORDING_SUFFIXES = (".npy", ".csv", ".raw", ".bin", ".dat")
+OUTPUT_FIELDS = ("recording", "n_breaths") + MetricsSummary._fields
+REPORT_EVERY = 100  # files
+
+logger = logging.getLogger(__name__)
+
+
+def find_recordings(pattern):
+    # Recordings with one of RECORDING_SUFFIXES in a directory, or the files
+    # matching a glob pattern
+    if os.path.isdir(pattern):
+        paths = [
+            os.path.join(pattern, name)
+            for name in os.listdir(pattern)
+            if name.endswith(RECORDING_SUFFIXES)
+        ]
+    else:
+        paths = glob.glob(pattern, recursive=True)
+
+    return sorted(path for path in paths if os.path.isfile(path))
+
+
+def breaths_path(breaths_dir, path):
+    return os.path.join(breaths_dir, os.path.basename(path) + ".npz")
+
+
+def _process_file(path, sr, raw_dtype, breaths_dir, params):
+    # Errors are returned rather than raised so one bad file does not stop the
+    # batch, and the file is retried on the next run
+    try:
+        bm = BreathMetrics(load_signal(path, raw_dtype), sr, **params)
+        breaths, metrics = bm.breaths, bm.metrics
+    except Exception as error:  # pylint: disable=broad-except
+        return path, None, f"{type(error).__name__}: {error}"
+
+    if breaths_dir is not None:
+        breaths.save(breaths_path(breaths_dir, path))
+
+    row = (path, len(breaths)) + tuple(metrics[f] for f in MetricsSummary._fields)
+    return path, row, None
+
+
+def _is_complete(row):
+    if len(row) != len(OUTPUT_FIELDS) or row[0] == "recording":
+        return False
+    try:
+        int(row[1])
+        for value in row[2:]:
+            float(value)
+    except ValueError:
+        return False
+    return True
+
+
+def _drop_unterminated_line(path):
+    # An interrupted write leaves a last line without its newline, which would
+    # be glued to the next row appended
+    with open(path, "rb+") as file:
+        data = file.read()
+        if data and not data.endswith(b"\n"):
+            file.truncate(data.rfind(b"\n") + 1)
+
+
+# Rows appended to a CSV file as files complete, so an interrupted run keeps
+# what it finished. Files listed with all their values are done, and a
+# truncated last line is dropped
+class _CsvOutput:
+    def __init__(self, path):
+        self.done = set()
+        if os.path.exists(path):
+            _drop_unterminated_line(path)
+
+        is_new = not os.path.exists(path) or os.path.getsize(path) == 0
+        if not is_new:
+            with open(path, newline="", encoding="utf-8") as file:
+                self.done = {row[0] for row in csv.reader(file) if _is_complete(row)}
+
+        self._file = open(path, "a", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._file)
+        if is_new:
+            self._writer.writerow(OUTPUT_FIELDS)
+
+    def write(self, row):
+        self._writer.writerow(row)
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+# One array per field in a .npz archive, merged with the rows of the previous
+# run and written when the batch stops
+class _NpzOutput:
+    def __init__(self, path):
+        self.path = path
+        self._rows = []
+        if os.path.exists(path):
+            with np.load(path) as file:
+                columns = [file[field] for field in OUTPUT_FIELDS]
+            self._rows = [tuple(row) for row in zip(*columns)]
+
+        self.done = {str(row[0]) for row in self._rows}
+
+    def write(self, row):
+        self._rows.append(row)
+
+    def close(self):
+        columns = list(zip(*self._rows)) or [()] * len(OUTPUT_FIELDS)
+        arrays = {
+            "recording": np.array(columns[0], dtype=str),
+            "n_breaths": np.array(columns[1], dtype=np.int64),
+        }
+        for field, values in zip(OUTPUT_FIELDS[2:], columns[2:]):
+            arrays[field] = np.array(values, dtype=np.float64)
+
+        # Replaces the previous archive only once the new one is complete
+        tmp_path = self.path + ".tmp.npz"
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, self.path)
+
+
+def run_batch(
+    pattern,
+    output,
+    sr,
+    n_workers=None,
+    chunksize=1,
+    raw_dtype=None,
+    breaths_dir=None,
+    **params,
+):
+    # Runs BreathMetrics on every recording matching pattern and writes one row
+    # of metrics per file to output (.csv or .npz), skipping the files already
+    # in it. Breath tables are also saved to breaths_dir when given. Returns the
+    # number of processed, skipped and failed files
+    if output.endswith(".csv"):
+        out = _CsvOutput(output)
+    elif output.endswith(".npz"):
+        out = _NpzOutput(output)
+    else:
+        raise ValueError(f"Expected a .csv or .npz output, got {output}")
+
+    if breaths_dir is not None:
+        os.makedirs(breaths_dir, exist_ok=True)
+
+    paths = [
+        path
+        for path in find_recordings(pattern)
+        if os.path.abspath(path) != os.path.abspath(output)
+    ]
+    todo = [path for path in paths if path not in out.done]
+    n_skipped = len(paths) - len(todo)
+    n_processed, n_failed = 0, 0
+
+    start = time.perf_counter()
+    args = (
+        todo,
+        [sr] * len(todo),
+        [raw_dtype] * len(todo),
+        [breaths_dir] * len(todo),
+        [params] * len(todo),
+    )
+    executor = None if n_workers == 1 else ProcessPoolExecutor(n_workers)
+    try:
+        if executor is None:
+            results = map(_process_file, *args)
+        else:
+            results = executor.map(_process_file, *args, chunksize=chunksize)
+
+        for path, row, error in results:
+            if error is None:
+                out.write(row)
+                n_processed += 1
+            else:
+                logger.warning("Failed on %s: %s", path, error)
+                n_failed += 1
+
+            if (n_processed + n_failed) % REPORT_EVERY == 0:
+                _report(n_processed + n_failed, len(todo), start)
+    finally:
+        out.close()
+        if executor is not None:
+            executor.shutdown()
+
+    _report(n_processed + n_failed, len(todo), start)
+    logger.info("%d skipped, %d failed", n_skipped, n_failed)
+
+    return n_processed, n_skipped, n_failed
+
+
+def _report(n_done, n_files, start):
+    elapsed = time.perf_counter() - start
+    logger.info(
+        "%d/%d files in %.1f s (%.2f files/s)",
+        n_done,
+        n_files,
+        elapsed,
+        n_done / elapsed if elapsed > 0 else 0.0,
+    )
@@ -1,3 +1,26 @@
-from ._findExtrema import find_potential_extrema, pwct, find_corrected_extrema
+from ._findExtrema import (
+    SHIFT,
+    WINDOW_SIZES,
+    find_potential_extrema,
+    find_hist_threshold,
+    count_votes,
+    pwct,
+    select_extrema,
+    correct_extrema,
+    find_corrected_extrema,
+)
+from ._sweep import ExtremaSweep, sweep_votes
 
-__all__ = ["find_potential_extrema", "pwct", "find_corrected_extrema"]
+__all__ = [
+    "SHIFT",
+    "WINDOW_SIZES",
+    "find_potential_extrema",
+    "find_hist_threshold",
+    "count_votes",
+    "pwct",
+    "correct_extrema",
+    "find_corrected_extrema",
+    "select_extrema",
+    "ExtremaSweep",
+    "sweep_votes",
+]
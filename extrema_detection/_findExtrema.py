@@ -1,11 +1,44 @@
 from math import floor
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from backend import kernel
+from instrumentation import instrument
 
 SHIFT = 3
 WINDOW_SIZES = [300, 500, 700, 1000, 5000]  # ms
 
 
-def find_potential_extrema(y, sr, window_sizes_ms=None, shift=SHIFT):
+def _window_extrema(y, w_size, shift, offset=0, stop=None):
+    step = max(int(w_size / shift), 1)
+
+    # Windows start at multiples of step counted from the absolute index 0, y
+    # starting at the absolute index offset
+    stop = offset + y.size if stop is None else min(stop, offset + y.size)
+    w_starts = np.arange(-(-offset // step) * step, stop, step) - offset
+
+    troughs = np.empty(w_starts.shape, dtype=int)
+    peaks = np.empty(w_starts.shape, dtype=int)
+
+    # Windows that fit in the signal are reduced all at once through a strided view
+    n_full = np.searchsorted(w_starts, y.size - w_size, "right")
+    if n_full > 0:
+        windows = sliding_window_view(y[w_starts[0] :], w_size)[::step][:n_full]
+        troughs[:n_full] = windows.argmin(axis=1) + w_starts[:n_full]
+        peaks[:n_full] = windows.argmax(axis=1) + w_starts[:n_full]
+
+    # The last windows are truncated by the end of the signal
+    for i in range(n_full, w_starts.size):
+        window = y[w_starts[i] :]
+        troughs[i] = np.argmin(window) + w_starts[i]
+        peaks[i] = np.argmax(window) + w_starts[i]
+
+    return peaks + offset, troughs + offset
+
+
+@instrument("extrema_detection.find_potential_extrema")
+def find_potential_extrema(
+    y, sr, window_sizes_ms=None, shift=SHIFT, offset=0, stop=None
+):
     if window_sizes_ms is None:
         window_sizes_ms = WINDOW_SIZES
 
@@ -16,19 +49,10 @@ def find_potential_extrema(y, sr, window_sizes_ms=None, shift=SHIFT):
     window_sizes = np.floor(sr / 1000 * np.array(window_sizes_ms)).astype(int)
 
     for w_size in window_sizes:
-        troughs.append([])
-        peaks.append([])
-
-        w_start = 0
-        while w_start < y.size:
-            window = y[w_start : min(w_start + w_size, len(y))]
+        w_peaks, w_troughs = _window_extrema(y, w_size, shift, offset, stop)
+        peaks.append(w_peaks)
+        troughs.append(w_troughs)
 
-            troughs[-1].append(np.argmin(window) + w_start)
-            peaks[-1].append(np.argmax(window) + w_start)
-
-            w_start += int(w_size / shift)
-        troughs[-1] = np.array(troughs[-1])
-        peaks[-1] = np.array(peaks[-1])
     return peaks, troughs
 
 
@@ -36,31 +60,56 @@ def find_threshold(votes, window_sizes=None, shift=SHIFT):
     if window_sizes is None:
         window_sizes = WINDOW_SIZES
 
-    count_threshold = np.arange(1, len(window_sizes) * shift)
+    votes_hist = np.bincount(votes, minlength=len(window_sizes) * shift)
+    return find_hist_threshold(votes_hist, window_sizes, shift)
 
-    n_extrema = []
 
-    for threshold in count_threshold:
-        n_extrema.append((votes > threshold).sum())
+def find_hist_threshold(votes_hist, window_sizes=None, shift=SHIFT):
+    if window_sizes is None:
+        window_sizes = WINDOW_SIZES
 
-    diff_n_extrema = []
-    for n in range(1, len(n_extrema)):
-        diff_n_extrema.append(n_extrema[n] - n_extrema[n - 1])
+    count_threshold = np.arange(1, len(window_sizes) * shift)
 
-    imax = [i for i, j in enumerate(diff_n_extrema) if j == max(diff_n_extrema)][-1]
+    # Number of extrema with more votes than each threshold, from the number of
+    # extrema with each vote count
+    n_extrema = votes_hist.sum() - np.cumsum(votes_hist)[count_threshold]
+
+    diff_n_extrema = np.diff(n_extrema)
+    imax = diff_n_extrema.size - 1 - np.argmax(diff_n_extrema[::-1])
 
     return imax
 
 
+def count_votes(peaks, troughs):
+    # Peaks and troughs share one sorted key space: even keys are peaks and odd
+    # keys are troughs. Each window size contributes an already sorted run, which
+    # the stable sort merges
+    keys = np.concatenate([2 * p for p in peaks] + [2 * t + 1 for t in troughs])
+    keys.sort(kind="stable")
+
+    first = np.flatnonzero(np.hstack(([True], keys[1:] != keys[:-1])))
+    unique_keys = keys[first]
+    votes = np.diff(np.append(first, keys.size))
+
+    is_peak = unique_keys % 2 == 0
+    return (
+        unique_keys[is_peak] // 2,
+        votes[is_peak],
+        unique_keys[~is_peak] // 2,
+        votes[~is_peak],
+    )
+
+
+@instrument("extrema_detection.pwct")
 def pwct(peaks, troughs, window_sizes=None, shift=SHIFT):
-    if window_sizes is None:
-        window_sizes = WINDOW_SIZES
+    return select_extrema(*count_votes(peaks, troughs), window_sizes, shift)
 
-    _peaks = np.hstack(tuple(peaks)).flatten()
-    _troughs = np.hstack(tuple(troughs)).flatten()
 
-    peak_idx, peak_votes = np.unique(_peaks, return_counts=True)
-    trough_idx, trough_votes = np.unique(_troughs, return_counts=True)
+def select_extrema(
+    peak_idx, peak_votes, trough_idx, trough_votes, window_sizes=None, shift=SHIFT
+):
+    if window_sizes is None:
+        window_sizes = WINDOW_SIZES
 
     peak_threshold = find_threshold(peak_votes, window_sizes, shift)
     trough_threshold = find_threshold(trough_votes, window_sizes, shift)
@@ -73,66 +122,100 @@ def pwct(peaks, troughs, window_sizes=None, shift=SHIFT):
     )
 
 
-def find_corrected_extrema(y, peaks_idx, troughs_idx):
-    corrected_peaks = []
-    corrected_troughs = []
+@kernel
+def _correct_extrema(
+    peaks_idx,
+    troughs_idx,
+    peak_values,
+    trough_values,
+    corrected_peaks,
+    corrected_troughs,
+):
+    n_peaks = peaks_idx.shape[0]
+    n_troughs = troughs_idx.shape[0]
+    n_breaths = 0
+
+    if n_peaks == 0:
+        return n_breaths
 
     t_slow = 0
-    while peaks_idx[0] > troughs_idx[t_slow]:
+    while t_slow < n_troughs and peaks_idx[0] > troughs_idx[t_slow]:
         t_slow += 1
 
     p_slow, p_fast = 0, 1
     t_fast = t_slow + 1
 
-    while p_slow < len(peaks_idx) and t_slow < len(troughs_idx):
-        if p_fast < len(peaks_idx):
+    while p_slow < n_peaks and t_slow < n_troughs:
+        if p_fast < n_peaks:
             p_t_offset = troughs_idx[t_slow] - peaks_idx[p_slow]
             p_p_offset = peaks_idx[p_fast] - peaks_idx[p_slow]
 
             if p_p_offset < p_t_offset:
-                fake_peak_idx = np.argmin([y[peaks_idx[p_slow]], y[peaks_idx[p_fast]]])
-
-                if fake_peak_idx == 0:
+                # Slow peak is the lowest of the two
+                if peak_values[p_slow] <= peak_values[p_fast]:
                     p_slow += 1
                 p_fast += 1
 
                 continue
 
-        if t_fast < len(troughs_idx):
+        if t_fast < n_troughs:
             p_t_offset = troughs_idx[t_slow] - peaks_idx[p_slow]
             t_t_offset = troughs_idx[t_fast] - troughs_idx[t_slow]
 
             if t_t_offset < p_t_offset:
-                fake_offset_idx = np.argmax(
-                    [y[troughs_idx[t_slow]], y[troughs_idx[t_fast]]]
-                )
-
-                if fake_offset_idx == 0:
+                # Slow trough is the highest of the two
+                if trough_values[t_slow] >= trough_values[t_fast]:
                     t_slow += 1
                 t_fast += 1
 
                 continue
 
         reset = False
-        p_t_offset = troughs_idx[t_slow] - peaks_idx[p_slow]
-        while p_t_offset <= 0:
+        while t_slow < n_troughs and troughs_idx[t_slow] - peaks_idx[p_slow] <= 0:
             reset = True
             t_slow += 1
             t_fast += 1
-            p_t_offset = troughs_idx[t_slow] - peaks_idx[p_slow]
         if reset:
             continue
-        assert (
-            p_t_offset > 0
-        ), f"Unexpected Error: peak found at {peaks_idx[p_slow]} after trough found at {troughs_idx[t_slow]},\n\
-        Expected peaks to be followed by troughs."
 
-        corrected_peaks.append(peaks_idx[p_slow])
-        corrected_troughs.append(troughs_idx[t_slow])
+        corrected_peaks[n_breaths] = peaks_idx[p_slow]
+        corrected_troughs[n_breaths] = troughs_idx[t_slow]
+        n_breaths += 1
 
         p_slow = p_fast
         p_fast += 1
         t_slow = t_fast
         t_fast += 1
 
-    return np.array(corrected_peaks), np.array(corrected_troughs)
+    return n_breaths
+
+
+def correct_extrema(peaks_idx, troughs_idx, peak_values, trough_values, backend=None):
+    peaks_idx = np.asarray(peaks_idx, dtype=np.int64)
+    troughs_idx = np.asarray(troughs_idx, dtype=np.int64)
+
+    # Every breath consumes at least one peak and one trough
+    corrected_peaks = np.empty((min(peaks_idx.size, troughs_idx.size),), dtype=np.int64)
+    corrected_troughs = np.empty_like(corrected_peaks)
+
+    n_breaths = _correct_extrema(
+        peaks_idx,
+        troughs_idx,
+        np.asarray(peak_values),
+        np.asarray(trough_values),
+        corrected_peaks,
+        corrected_troughs,
+        backend=backend,
+    )
+
+    return corrected_peaks[:n_breaths], corrected_troughs[:n_breaths]
+
+
+@instrument("extrema_detection.find_corrected_extrema")
+def find_corrected_extrema(y, peaks_idx, troughs_idx, backend=None):
+    peaks_idx = np.asarray(peaks_idx, dtype=np.int64)
+    troughs_idx = np.asarray(troughs_idx, dtype=np.int64)
+
+    return correct_extrema(
+        peaks_idx, troughs_idx, y[peaks_idx], y[troughs_idx], backend
+    )
@@ -0,0 +1,106 @@
+import numpy as np
+from ._findExtrema import SHIFT, WINDOW_SIZES, count_votes
+
+
+def _pick(y, a, b, is_max):
+    # The first of two candidates on ties, as np.argmax and np.argmin
+    if is_max:
+        return np.where(y[a] >= y[b], a, b)
+    return np.where(y[a] <= y[b], a, b)
+
+
+# Sparse tables of the argmax and argmin of y over every range of 2**k samples,
+# kept only for the levels k the window sizes need. A window is then reduced in
+# O(1) from the two ranges of 2**k samples covering it, whatever its size and
+# stride. Ties resolve to the first index, as in find_potential_extrema.
+class ExtremaSweep:
+    def __init__(self, y, sr, window_sizes_ms=None):
+        if window_sizes_ms is None:
+            window_sizes_ms = WINDOW_SIZES
+
+        self.y = np.asarray(y)
+        self.sr = sr
+        self._windows = {}
+
+        n_samples = self.y.shape[0]
+        window_sizes = self.window_sizes(window_sizes_ms)
+        levels = {int(w_size).bit_length() - 1 for w_size in window_sizes}
+        index = np.int32 if n_samples < 2**31 else np.int64
+
+        self._argmax, self._argmin = {}, {}
+        argmax = argmin = np.arange(n_samples, dtype=index)
+        for k in range(max(levels, default=0) + 1):
+            if k > 0:
+                half = 1 << (k - 1)
+                size = n_samples - 2 * half + 1
+                if size <= 0:
+                    # Windows this long are all truncated by the end of y
+                    break
+                argmax = _pick(self.y, argmax[:size], argmax[half : half + size], True)
+                argmin = _pick(self.y, argmin[:size], argmin[half : half + size], False)
+            if k in levels:
+                self._argmax[k], self._argmin[k] = argmax, argmin
+
+    def window_sizes(self, window_sizes_ms):
+        return np.floor(self.sr / 1000 * np.array(window_sizes_ms)).astype(int)
+
+    def window_extrema(self, w_size, step):
+        # Peaks and troughs of the windows of w_size samples starting every step
+        # samples, computed once per pair
+        if (w_size, step) in self._windows:
+            return self._windows[w_size, step]
+
+        n_samples = self.y.shape[0]
+        w_starts = np.arange(0, n_samples, step)
+        n_full = np.searchsorted(w_starts, n_samples - w_size, "right")
+
+        peaks = np.empty(w_starts.shape, dtype=np.int64)
+        troughs = np.empty(w_starts.shape, dtype=np.int64)
+        if n_full > 0:
+            k = int(w_size).bit_length() - 1
+            if k not in self._argmax:
+                raise ValueError(f"No sparse table level for {w_size} samples")
+
+            starts = w_starts[:n_full]
+            ends = starts + w_size - (1 << k)
+            argmax, argmin = self._argmax[k], self._argmin[k]
+            peaks[:n_full] = _pick(self.y, argmax[starts], argmax[ends], True)
+            troughs[:n_full] = _pick(self.y, argmin[starts], argmin[ends], False)
+
+        # The last windows are truncated by the end of the signal
+        for i in range(n_full, w_starts.size):
+            window = self.y[w_starts[i] :]
+            peaks[i] = np.argmax(window) + w_starts[i]
+            troughs[i] = np.argmin(window) + w_starts[i]
+
+        self._windows[w_size, step] = peaks, troughs
+        return peaks, troughs
+
+    def potential_extrema(self, window_sizes_ms=None, shift=SHIFT):
+        if window_sizes_ms is None:
+            window_sizes_ms = WINDOW_SIZES
+
+        peaks, troughs = [], []
+        for w_size in self.window_sizes(window_sizes_ms):
+            w_peaks, w_troughs = self.window_extrema(
+                w_size, max(int(w_size / shift), 1)
+            )
+            peaks.append(w_peaks)
+            troughs.append(w_troughs)
+
+        return peaks, troughs
+
+    def votes(self, window_sizes_ms=None, shift=SHIFT):
+        return count_votes(*self.potential_extrema(window_sizes_ms, shift))
+
+
+def sweep_votes(y, sr, configs):
+    # Vote tables (peaks, peak votes, troughs, trough votes) of every
+    # (window_sizes_ms, shift) configuration, sharing one sparse table and the
+    # extrema of the windows common to several configurations
+    configs = [(tuple(window_sizes_ms), shift) for window_sizes_ms, shift in configs]
+    sweep = ExtremaSweep(
+        y, sr, sorted({w for window_sizes_ms, _ in configs for w in window_sizes_ms})
+    )
+
+    return {config: sweep.votes(*config) for config in configs}
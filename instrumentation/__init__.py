@@ -0,0 +1,15 @@
+from ._instrumentation import (
+    StageRecord,
+    Collector,
+    current_collector,
+    collect,
+    instrument,
+)
+
+__all__ = [
+    "StageRecord",
+    "Collector",
+    "current_collector",
+    "collect",
+    "instrument",
+]
@@ -0,0 +1,149 @@
+import functools
+import time
+import tracemalloc
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import NamedTuple
+import numpy as np
+
+_collector = ContextVar("collector", default=None)
+
+
+class StageRecord(NamedTuple):
+    stage: str
+    wall_time: float  # s
+    n_samples: int
+    allocated_bytes: int  # None unless memory is tracked
+
+
+# Totals per stage of the instrumented calls made while it is the current
+# collector. Records are also passed to every callback as calls complete. With
+# track_memory, allocated_bytes is the peak memory traced by tracemalloc during
+# the call above what was allocated when it started, nested calls included.
+# The traced peak is process-wide, so it is only reset between calls with
+# reset_peak (Python 3.9+, and only when the collector owns the tracing).
+# Otherwise a call that does not raise the peak reports the most memory seen at
+# the end of its nested calls and its own, a lower bound.
+class Collector:
+    def __init__(self, callbacks=(), track_memory=False, reset_peak=False):
+        self.callbacks = list(callbacks)
+        self.track_memory = track_memory
+        self.reset_peak = reset_peak
+        self.stats = {}
+
+        # Memory and traced peak at the start of each running call, and the
+        # largest peak of the calls it made
+        self._frames = []
+
+    def start_call(self):
+        if not self.track_memory:
+            return
+
+        current, peak = tracemalloc.get_traced_memory()
+        if self.reset_peak:
+            if self._frames:
+                self._frames[-1][1] = max(self._frames[-1][1], peak)
+            tracemalloc.reset_peak()
+            peak = current
+        self._frames.append([current, current, peak])
+
+    def stop_call(self):
+        if not self.track_memory:
+            return None
+
+        current, peak = tracemalloc.get_traced_memory()
+        start, nested_peak, start_peak = self._frames.pop()
+        peak = max(peak if peak > start_peak else current, nested_peak)
+        if self._frames:
+            self._frames[-1][1] = max(self._frames[-1][1], peak)
+        return peak - start
+
+    def record(self, record):
+        stats = self.stats.setdefault(
+            record.stage,
+            {"calls": 0, "wall_time": 0.0, "n_samples": 0, "allocated_bytes": 0},
+        )
+        stats["calls"] += 1
+        stats["wall_time"] += record.wall_time
+        stats["n_samples"] += record.n_samples
+        if record.allocated_bytes is not None:
+            stats["allocated_bytes"] = max(
+                stats["allocated_bytes"], record.allocated_bytes
+            )
+
+        for callback in self.callbacks:
+            callback(record)
+
+    def summary(self):
+        # One line per stage, slowest first
+        lines = [
+            f"{stage}: {s['calls']} calls, {s['wall_time']:.4f} s, "
+            f"{s['n_samples']} samples, {s['allocated_bytes']} bytes"
+            for stage, s in sorted(
+                self.stats.items(), key=lambda item: -item[1]["wall_time"]
+            )
+        ]
+        return "\n".join(lines)
+
+
+def current_collector():
+    return _collector.get()
+
+
+@contextmanager
+def collect(*callbacks, track_memory=False):
+    # Collects the instrumented calls made in the block, in this thread or task
+    started_tracing = track_memory and not tracemalloc.is_tracing()
+    collector = Collector(
+        callbacks,
+        track_memory,
+        reset_peak=started_tracing and hasattr(tracemalloc, "reset_peak"),
+    )
+    if started_tracing:
+        tracemalloc.start()
+
+    token = _collector.set(collector)
+    try:
+        yield collector
+    finally:
+        _collector.reset(token)
+        if started_tracing:
+            tracemalloc.stop()
+
+
+def _n_samples(args):
+    # Samples of the array arguments, and of arrays in list or tuple arguments
+    n_samples = 0
+    for arg in args:
+        if isinstance(arg, np.ndarray):
+            n_samples += arg.size
+        elif isinstance(arg, (list, tuple)):
+            n_samples += sum(a.size for a in arg if isinstance(a, np.ndarray))
+    return n_samples
+
+
+def instrument(stage):
+    # Records the calls of a function under stage when a collector is active,
+    # at the cost of one context variable lookup otherwise
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            collector = _collector.get()
+            if collector is None:
+                return func(*args, **kwargs)
+
+            collector.start_call()
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                wall_time = time.perf_counter() - start
+                collector.record(
+                    StageRecord(
+                        stage, wall_time, _n_samples(args), collector.stop_call()
+                    )
+                )
+
+        return wrapper
+
+    return decorator
@@ -1,23 +1,40 @@
 from ._metrics import (
+    find_time_between_breaths,
     find_interbreath_interval,
     find_breathing_rate,
     find_volumes,
+    find_interval_bounds,
     find_tidal_volume,
     find_minute_ventilation,
     find_duty_cycle,
     find_coef_var_breathing_rate,
     find_coef_var_breath_volumes,
+    find_duration,
     find_coef_var_duty_cycle,
 )
+from ._table import BREATH_DTYPE, BreathTable
+from ._summary import MetricsSummary, summarize
+from ._rolling import ROLLING_WINDOW, ROLLING_HOP, ROLLING_FIELDS, find_rolling_metrics
 
 __all__ = [
+    "find_time_between_breaths",
     "find_interbreath_interval",
     "find_breathing_rate",
     "find_volumes",
+    "find_interval_bounds",
     "find_tidal_volume",
     "find_minute_ventilation",
     "find_duty_cycle",
     "find_coef_var_breathing_rate",
     "find_coef_var_breath_volumes",
+    "find_duration",
     "find_coef_var_duty_cycle",
+    "BREATH_DTYPE",
+    "BreathTable",
+    "MetricsSummary",
+    "summarize",
+    "ROLLING_WINDOW",
+    "ROLLING_HOP",
+    "ROLLING_FIELDS",
+    "find_rolling_metrics",
 ]
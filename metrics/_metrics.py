@@ -1,10 +1,10 @@
 import numpy as np
+from instrumentation import instrument
+from onset_offset_detection import is_missing
 
 
 def find_time_between_breaths(sr, inhale_onsets):
-    samples_between = np.array(
-        [inhale_onsets[i + 1] - inhale_onsets[i] for i in range(len(inhale_onsets) - 1)]
-    )
+    samples_between = np.diff(inhale_onsets)
     time_between = samples_between / sr
     return time_between
 
@@ -24,25 +24,39 @@ def find_coef_var_breathing_rate(sr, inhale_onsets):
     return time_between.std() / time_between.mean()
 
 
+def find_interval_bounds(onsets, offsets, n_samples):
+    # Bounds of [onset, offset] as half-open sample ranges, empty where the
+    # offset is missing
+    is_valid = ~is_missing(offsets)
+
+    stops = np.zeros(onsets.shape, dtype=int)
+    stops[is_valid] = offsets[is_valid].astype(int) + 1
+    stops = np.clip(stops, onsets, n_samples)
+
+    return stops, is_valid
+
+
+def _interval_sums(y_abs_cumsum, onsets, offsets):
+    # Sums of abs(y) over [onset, offset], NaN where the offset is missing
+    stops, is_valid = find_interval_bounds(onsets, offsets, y_abs_cumsum.shape[0] - 1)
+
+    sums = y_abs_cumsum[stops] - y_abs_cumsum[onsets]
+    return np.where(is_valid, sums, np.nan)
+
+
+@instrument("metrics.find_volumes")
 def find_volumes(y, sr, inhale_onsets, inhale_offsets, exhale_onsets, exhale_offsets):
-    inhale_volumes = np.zeros(inhale_onsets.shape)
-    exhale_volumes = np.zeros(exhale_onsets.shape)
-
-    for breath in range(inhale_onsets.shape[0]):
-        if not np.isnan(inhale_offsets[breath]):
-            inhale_volumes[breath] = abs(
-                y[inhale_onsets[breath] : int(inhale_offsets[breath]) + 1]
-            ).sum()
-        else:
-            inhale_volumes[breath] = np.nan
-
-    for breath in range(exhale_onsets.shape[0]):
-        if not np.isnan(exhale_offsets[breath]):
-            exhale_volumes[breath] = abs(
-                y[exhale_onsets[breath] : int(exhale_offsets[breath]) + 1]
-            ).sum()
-        else:
-            exhale_volumes[breath] = np.nan
+    # Accumulated in double precision whatever the dtype of y
+    y_abs_cumsum = np.zeros((y.shape[0] + 1,))
+    np.abs(y, out=y_abs_cumsum[1:])
+    np.cumsum(y_abs_cumsum, out=y_abs_cumsum)
+
+    inhale_volumes = _interval_sums(
+        y_abs_cumsum, np.asarray(inhale_onsets), np.asarray(inhale_offsets)
+    )
+    exhale_volumes = _interval_sums(
+        y_abs_cumsum, np.asarray(exhale_onsets), np.asarray(exhale_offsets)
+    )
 
     inhale_volumes = inhale_volumes / sr * 1000
     exhale_volumes = exhale_volumes / sr * 1000
@@ -63,12 +77,8 @@ def find_minute_ventilation(breathing_rate, tidal_volume):
 
 
 def find_duration(sr, onsets, offsets):
-    duration = np.zeros(onsets.shape)
-    for breath in range(onsets.shape[0]):
-        if not np.isnan(offsets[breath]):
-            duration[breath] = offsets[breath] - onsets[breath]
-        else:
-            duration[breath] = np.nan
+    # Missing offsets give NaN durations
+    duration = np.where(~is_missing(offsets), np.asarray(offsets) - onsets, np.nan)
 
     duration = duration / sr
     return duration
@@ -0,0 +1,96 @@
+import numpy as np
+from instrumentation import instrument
+
+ROLLING_WINDOW = 30  # s
+ROLLING_HOP = 5  # s
+
+ROLLING_FIELDS = (
+    "start",
+    "n_breaths",
+    "breathing_rate",
+    "interbreath_interval",
+    "coef_var_breathing_rate",
+    "tidal_volume",
+    "minute_ventilation",
+    "duty_cycle",
+    "coef_var_duty_cycle",
+    "coef_var_breath_volumes",
+)
+
+
+def _prefix_moments(values):
+    # Prefix counts, sums and sums of squares of the non-NaN values. Values are
+    # centered on their mean first so the variances do not cancel out
+    is_valid = ~np.isnan(values)
+    center = values[is_valid].mean() if is_valid.any() else 0.0
+    centered = np.where(is_valid, values - center, 0.0)
+
+    moments = np.zeros((3, values.shape[0] + 1))
+    np.cumsum(is_valid, out=moments[0, 1:])
+    np.cumsum(centered, out=moments[1, 1:])
+    np.cumsum(centered**2, out=moments[2, 1:])
+    return moments, center
+
+
+def _window_mean_std(values, lower, upper):
+    # Mean and population standard deviation of values[lower:upper] for each
+    # window, ignoring NaN
+    moments, center = _prefix_moments(np.asarray(values, dtype=np.float64))
+    count, total, squares = moments[:, upper] - moments[:, lower]
+
+    mean = total / count
+    var = np.maximum(squares / count - mean**2, 0)
+    return mean + center, np.sqrt(var)
+
+
+@instrument("metrics.find_rolling_metrics")
+def find_rolling_metrics(
+    breaths, window=ROLLING_WINDOW, hop=ROLLING_HOP, start=0, stop=None
+):
+    # Metrics of the breaths with an inhale onset in [t, t + window) seconds, for
+    # t from start by steps of hop, as long as the window ends before stop (by
+    # default just after the last inhale onset). Every window is reduced from
+    # prefix sums over the breaths, NaN when it holds too few breaths
+    sr = breaths.sr
+    inhale_onsets = breaths["inhale_onsets"]
+    if stop is None:
+        stop = (inhale_onsets[-1] + 1) / sr if len(breaths) else start
+
+    n_windows = max(int(np.floor((stop - start - window) / hop)) + 1, 0)
+    starts = start + hop * np.arange(n_windows)
+    lower = np.searchsorted(inhale_onsets, starts * sr, "left")
+    upper = np.searchsorted(inhale_onsets, (starts + window) * sr, "left")
+
+    # Intervals between consecutive onsets of the same window
+    intervals = np.diff(inhale_onsets) / sr
+    interval_upper = np.maximum(upper - 1, lower)
+
+    rolling = np.empty(starts.shape, dtype=[(f, np.float64) for f in ROLLING_FIELDS])
+    rolling["start"] = starts
+    rolling["n_breaths"] = upper - lower
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        interbreath_interval, interval_std = _window_mean_std(
+            intervals, lower, interval_upper
+        )
+        inhale_volume, inhale_volume_std = _window_mean_std(
+            breaths["inhale_volumes"], lower, upper
+        )
+        exhale_volume, _ = _window_mean_std(breaths["exhale_volumes"], lower, upper)
+        inhale_duration, inhale_duration_std = _window_mean_std(
+            breaths["inhale_durations"], lower, upper
+        )
+
+        breathing_rate = 1 / interbreath_interval
+        tidal_volume = inhale_volume + exhale_volume
+
+        rolling["breathing_rate"] = breathing_rate
+        rolling["interbreath_interval"] = interbreath_interval
+        rolling["coef_var_breathing_rate"] = interval_std / interbreath_interval
+        rolling["tidal_volume"] = tidal_volume
+        rolling["minute_ventilation"] = breathing_rate * tidal_volume * 60
+        rolling["duty_cycle"] = inhale_duration / interbreath_interval
+        rolling["coef_var_duty_cycle"] = inhale_duration_std / inhale_duration
+        rolling["coef_var_breath_volumes"] = inhale_volume_std / inhale_volume
+
+    return rolling
@@ -0,0 +1,58 @@
+from typing import NamedTuple
+import numpy as np
+from instrumentation import instrument
+
+
+class MetricsSummary(NamedTuple):
+    breathing_rate: float
+    interbreath_interval: float
+    coef_var_breathing_rate: float
+    tidal_volume: float
+    minute_ventilation: float
+    duty_cycle: float
+    coef_var_duty_cycle: float
+    coef_var_breath_volumes: float
+
+
+def _mean_std(values):
+    # Mean and population standard deviation ignoring NaN, from one count, sum
+    # and sum of squares of the values shifted by the first valid one
+    is_valid = ~np.isnan(values)
+    count = np.count_nonzero(is_valid)
+    if count == 0:
+        return np.nan, np.nan
+
+    shifted = values[is_valid] - values[is_valid][0]
+    total = shifted.sum()
+    squares = np.dot(shifted, shifted)
+
+    mean = total / count
+    return mean + values[is_valid][0], np.sqrt(max(squares / count - mean**2, 0))
+
+
+@instrument("metrics.summarize")
+def summarize(breaths):
+    # All the metrics of a BreathTable, each column reduced once and shared by
+    # the metrics built on it
+    inhale_onsets = breaths["inhale_onsets"]
+    intervals = np.diff(inhale_onsets) / breaths.sr
+
+    interbreath_interval, interval_std = _mean_std(intervals)
+    inhale_volume, inhale_volume_std = _mean_std(breaths["inhale_volumes"])
+    exhale_volume, _ = _mean_std(breaths["exhale_volumes"])
+    inhale_duration, inhale_duration_std = _mean_std(breaths["inhale_durations"])
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        breathing_rate = np.float64(1) / interbreath_interval
+        tidal_volume = inhale_volume + exhale_volume
+
+        return MetricsSummary(
+            breathing_rate=breathing_rate,
+            interbreath_interval=interbreath_interval,
+            coef_var_breathing_rate=interval_std / interbreath_interval,
+            tidal_volume=tidal_volume,
+            minute_ventilation=breathing_rate * tidal_volume * 60,
+            duty_cycle=inhale_duration / interbreath_interval,
+            coef_var_duty_cycle=inhale_duration_std / inhale_duration,
+            coef_var_breath_volumes=inhale_volume_std / inhale_volume,
+        )
@@ -0,0 +1,80 @@
+import numpy as np
+
+BREATH_DTYPE = np.dtype(
+    [
+        ("peaks", np.int64),
+        ("troughs", np.int64),
+        ("inhale_onsets", np.int64),
+        ("exhale_onsets", np.int64),
+        ("inhale_pause_onsets", np.int64),
+        ("exhale_pause_onsets", np.int64),
+        ("inhale_offsets", np.int64),
+        ("exhale_offsets", np.int64),
+        ("inhale_volumes", np.float64),
+        ("exhale_volumes", np.float64),
+        ("inhale_durations", np.float64),
+        ("exhale_durations", np.float64),
+    ]
+)
+
+
+# One record per breath in a structured array, sorted by inhale onset. Columns
+# are returned as views of the records, and rows or time ranges as tables
+# sharing them. Missing pause onsets and offsets are MISSING, their durations and
+# volumes NaN.
+class BreathTable:
+    __slots__ = ("data", "sr")
+
+    def __init__(self, data, sr):
+        data = np.asarray(data)
+        if data.dtype != BREATH_DTYPE:
+            raise ValueError(f"Expected records of {BREATH_DTYPE}, got {data.dtype}")
+
+        self.data = data
+        self.sr = sr
+
+    @classmethod
+    def from_columns(cls, sr, **columns):
+        missing = set(BREATH_DTYPE.names) - set(columns)
+        if missing:
+            raise ValueError(f"Missing columns {sorted(missing)}")
+
+        data = np.empty((len(columns["peaks"]),), dtype=BREATH_DTYPE)
+        for name in BREATH_DTYPE.names:
+            data[name] = columns[name]
+
+        return cls(data, sr)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as file:
+            return cls(file["breaths"], file["sr"].item())
+
+    def save(self, path):
+        # Uncompressed .npz archive of the records and the sampling rate
+        np.savez(path, breaths=self.data, sr=self.sr)
+
+    @property
+    def columns(self):
+        return BREATH_DTYPE.names
+
+    def __len__(self):
+        return self.data.shape[0]
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self.data[key]
+        return BreathTable(np.atleast_1d(self.data[key]), self.sr)
+
+    def __repr__(self):
+        return f"BreathTable({len(self)} breaths, sr={self.sr})"
+
+    def between(self, start, stop):
+        # Breaths with an inhale onset in [start, stop) seconds
+        bounds = np.searchsorted(
+            self.data["inhale_onsets"], np.array([start, stop]) * self.sr, "left"
+        )
+        return BreathTable(self.data[bounds[0] : bounds[1]], self.sr)
+
+    def to_dict(self):
+        return {name: self.data[name] for name in BREATH_DTYPE.names}
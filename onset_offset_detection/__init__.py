@@ -1,3 +1,35 @@
-from ._findOnsetOffset import find_onsets, find_offsets
+from ._findOnsetOffset import (
+    MISSING,
+    is_missing,
+    N_BINS,
+    find_n_bins,
+    find_bin_params,
+    find_extrema_pause_onset,
+    find_extrema_pause_onsets,
+    find_pause_onsets,
+    find_onset_boundaries,
+    find_first_inhale_onset,
+    find_last_exhale_onset,
+    find_onsets,
+    find_offsets_from_onsets,
+    find_offsets,
+    find_last_exhale_offset,
+)
 
-__all__ = ["find_onsets", "find_offsets"]
+__all__ = [
+    "MISSING",
+    "is_missing",
+    "N_BINS",
+    "find_n_bins",
+    "find_bin_params",
+    "find_extrema_pause_onset",
+    "find_extrema_pause_onsets",
+    "find_pause_onsets",
+    "find_onset_boundaries",
+    "find_first_inhale_onset",
+    "find_last_exhale_onset",
+    "find_onsets",
+    "find_offsets_from_onsets",
+    "find_offsets",
+    "find_last_exhale_offset",
+]
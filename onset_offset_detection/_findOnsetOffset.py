@@ -1,15 +1,105 @@
 from math import floor
 import numpy as np
+from backend import kernel
+from instrumentation import instrument
+
+BINNING_THRES = 0.25
+N_BINS = 100  # sr > 100 Hz
+BIN_LEVELS = (25, 50, 100)  # bins of a window, the largest fitting it
+MIN_PTS_PER_BIN = 2  # average samples per bin
+LOW_SR = 100  # Hz, at most 50 bins at or below
+BLOCK_SIZE = 1 << 16  # samples
+EDGE_TOL = 1e-9
+MISSING = -1  # index of a pause or offset that was not found
 
 
 def hist(window, n_bins):
-    bins = np.linspace(window.min(), window.max(), n_bins)
-    pts_per_bin, bin_edges = np.histogram(window, bins=bins, density=False)
+    # Same counts as np.histogram over np.linspace edges, with the bins computed
+    # arithmetically instead of searched
+    w_min, w_max = window.min(), window.max()
+    bin_edges = np.linspace(w_min, w_max, n_bins)
+
+    if w_max == w_min:
+        # All the edges are equal and np.histogram puts every sample in the last
+        # bin
+        pts_per_bin = np.zeros((n_bins - 1,), dtype=np.int64)
+        pts_per_bin[-1] = window.shape[0]
+    else:
+        bins = ((window - w_min) * ((n_bins - 1) / (w_max - w_min))).astype(np.int64)
+        np.clip(bins, 0, n_bins - 2, out=bins)
+
+        # Samples within rounding error of an edge are placed by the edge values
+        bins -= window < bin_edges[bins]
+        bins += (window >= bin_edges[bins + 1]) & (bins < n_bins - 2)
+        pts_per_bin = np.bincount(bins, minlength=n_bins - 1)
+
     mode_bin = np.argmax(pts_per_bin)
 
     return pts_per_bin, bin_edges, mode_bin
 
 
+@kernel
+def _pause_bins(pts_per_bin, mode_bin, max_pause_bins, binning_thres):
+    min_bin = mode_bin
+    max_bin = mode_bin + 1
+    max_pts_total = pts_per_bin[mode_bin]
+
+    # Adds bins to the left
+    for bin_added in range(1, max_pause_bins + 1):
+        if pts_per_bin[mode_bin - bin_added] > max_pts_total * binning_thres:
+            min_bin = mode_bin - bin_added
+
+    # Adds bins to the right
+    for bin_added in range(1, max_pause_bins + 1):
+        if pts_per_bin[mode_bin + bin_added] > max_pts_total * binning_thres:
+            max_bin = mode_bin + bin_added
+
+    return min_bin, max_bin
+
+
+@kernel
+def _last_crossing(window, signal_zero_cross, is_inhale):
+    for i in range(window.shape[0] - 1, -1, -1):
+        if (
+            window[i] <= signal_zero_cross
+            if is_inhale
+            else window[i] > signal_zero_cross
+        ):
+            return i
+    return 0
+
+
+@_last_crossing.python
+def _last_crossing_numpy(window, signal_zero_cross, is_inhale):
+    idx = np.where(
+        (window <= signal_zero_cross if is_inhale else window > signal_zero_cross)
+    )[0]
+    return idx[-1] if idx.size > 0 else 0
+
+
+@kernel
+def _pause_bounds(window, min_pause_range, max_pause_range):
+    first = -1
+    for i in range(window.shape[0]):
+        if min_pause_range < window[i] < max_pause_range:
+            first = i
+            break
+
+    last = -1
+    for i in range(window.shape[0] - 1, first - 1, -1):
+        if min_pause_range < window[i] < max_pause_range:
+            last = i
+            break
+
+    return first, last
+
+
+@_pause_bounds.python
+def _pause_bounds_numpy(window, min_pause_range, max_pause_range):
+    pause_idx = np.where((window > min_pause_range) & (window < max_pause_range))[0]
+    return (pause_idx[0], pause_idx[-1]) if pause_idx.size > 0 else (-1, -1)
+
+
 def find_extrema_pause_onset(
     window,
     sample_offset,
@@ -20,6 +110,7 @@ def find_extrema_pause_onset(
     min_bins_for_pause,
     max_pause_bins,
     signal_zero_cross,
+    backend=None,
 ):
     pts_per_bin, bin_edges, mode_bin = hist(window, n_bins)
 
@@ -31,59 +122,270 @@ def find_extrema_pause_onset(
         or max_bin_ratio < min_bins_for_pause
     )
 
-    if not is_pause:
-        idx = np.where(
-            (window <= signal_zero_cross if is_inhale else window > signal_zero_cross)
-        )[0]
+    if is_pause:
+        min_bin, max_bin = _pause_bins(
+            pts_per_bin, mode_bin, max_pause_bins, BINNING_THRES, backend=backend
+        )
+        first, last = _pause_bounds(
+            window, bin_edges[min_bin], bin_edges[max_bin], backend=backend
+        )
 
-        extrema_onset = sample_offset + (idx[-1] if idx.size > 0 else 0)
-        pause_onset = np.nan
+        # No sample lies strictly inside the pause range
+        is_pause = first >= 0
+
+    if not is_pause:
+        extrema_onset = sample_offset + _last_crossing(
+            window, signal_zero_cross, is_inhale, backend=backend
+        )
+        pause_onset = MISSING
 
     else:
-        min_pause_range = bin_edges[mode_bin]
-        max_pause_range = bin_edges[mode_bin + 1]
-        max_pts_total = pts_per_bin[mode_bin]
-        binning_thres = 0.25
-
-        # Adds bins to the left
-        for bin_added in range(1, max_pause_bins + 1):
-            _bin = mode_bin - bin_added
-            n_pts_added = pts_per_bin[_bin]
-            if n_pts_added > max_pts_total * binning_thres:
-                min_pause_range = bin_edges[_bin]
-
-        # Adds bins to the right
-        for bin_added in range(1, max_pause_bins + 1):
-            _bin = mode_bin + bin_added
-            n_pts_added = pts_per_bin[_bin]
-            if n_pts_added > max_pts_total * binning_thres:
-                max_pause_range = bin_edges[_bin]
-
-        pause_idx = np.where((window > min_pause_range) & (window < max_pause_range))[0]
-        extrema_onset = sample_offset + pause_idx[-1] + 1
-        pause_onset = sample_offset + pause_idx[0] - 1
+        extrema_onset = sample_offset + last + 1
+        pause_onset = sample_offset + first - 1
 
     return extrema_onset, pause_onset
 
 
-def find_onsets(y, peaks_idx, troughs_idx):
-    n_bins = 100  # sr > 100 Hz
+def _bin_edge(bin_idx, edge_min, edge_step):
+    # Edge bin_idx of np.linspace(w_min, w_max, n_bins), computed like np.linspace
+    # from w_min and the step in its output dtype
+    return np.asarray(bin_idx).astype(edge_step.dtype) * edge_step + edge_min
+
+
+def _segment_pause_onsets(
+    y,
+    w_starts,
+    w_stops,
+    is_inhale,
+    n_bins,
+    upper_bins,
+    lower_bins,
+    min_bins_for_pause,
+    max_pause_bins,
+    signal_zero_cross,
+    backend,
+):
+    n_windows = w_starts.shape[0]
+    windows = np.arange(n_windows)
+    w_lengths = w_stops - w_starts
+    w_offsets = np.cumsum(w_lengths) - w_lengths
+
+    # Flattens the windows into one array, which is a view of y when they tile it
+    if np.array_equal(w_starts[1:], w_stops[:-1]):
+        sample_idx = np.arange(w_starts[0], w_stops[-1])
+        samples = y[w_starts[0] : w_stops[-1]]
+    else:
+        sample_idx = np.repeat(w_starts - w_offsets, w_lengths) + np.arange(
+            w_offsets[-1] + w_lengths[-1]
+        )
+        samples = y[sample_idx]
+
+    w_min = np.minimum.reduceat(samples, w_offsets)
+    w_max = np.maximum.reduceat(samples, w_offsets)
+    bin_width = (w_max - w_min) / (n_bins - 1)
+    is_flat = bin_width == 0
+
+    # Bins every sample arithmetically. Each window gets n_bins slots so the
+    # window maximum can land past the last bin before being folded back into it
+    with np.errstate(divide="ignore"):
+        bin_scale = 1 / bin_width
+    bin_scale[is_flat] = 0
+
+    sample_min = np.repeat(w_min, w_lengths)
+    sample_scale = np.repeat(bin_scale, w_lengths)
+    scaled = (samples - sample_min) * sample_scale
+    bins = scaled.astype(int)
+
+    # Samples that land within rounding error of a bin edge are checked against
+    # the np.linspace edge values, which decide the bin in np.histogram. The
+    # rounding error grows with the number of bins and the precision of samples.
+    # np.linspace computes the edges of float32 windows in float64 before NumPy 2
+    # and in float32 since, so they are computed in the dtype it gives here
+    edge_dtype = np.linspace(samples.dtype.type(0), samples.dtype.type(1), 2).dtype
+    edge_min = w_min.astype(edge_dtype)
+    edge_max = w_max.astype(edge_dtype)
+    edge_step = (edge_max - edge_min) / (n_bins - 1)
+    scaled -= bins
+    edge_tol = max(EDGE_TOL, 4 * n_bins * np.finfo(scaled.dtype).eps)
+    near_edge = np.flatnonzero((scaled < edge_tol) | (scaled > 1 - edge_tol))
+
+    # Window offsets are added as integers, which float32 could not hold to
+    # sub-bin precision past a few thousand windows
+    bins += np.repeat(windows * n_bins, w_lengths)
+    near_window = bins[near_edge] // n_bins
+    near_bin = bins[near_edge] % n_bins
+    near_samples = samples[near_edge]
+    lower_edge = _bin_edge(near_bin, edge_min[near_window], edge_step[near_window])
+    upper_edge = np.where(
+        near_bin + 1 < n_bins - 1,
+        _bin_edge(near_bin + 1, edge_min[near_window], edge_step[near_window]),
+        edge_max[near_window],
+    )
+    bins[near_edge] += (near_samples >= upper_edge) & (near_bin < n_bins - 2)
+    bins[near_edge] -= (near_samples < lower_edge) & (near_bin > 0)
+
+    pts_per_bin = np.bincount(bins, minlength=n_windows * n_bins).reshape(
+        n_windows, n_bins
+    )
+    pts_per_bin[:, -2] += pts_per_bin[:, -1]
+    pts_per_bin = pts_per_bin[:, :-1]
+
+    # All the edges of a flat window are equal and np.histogram puts every
+    # sample in the last bin
+    pts_per_bin[is_flat] = 0
+    pts_per_bin[is_flat, -1] = w_lengths[is_flat]
+
+    mode_bin = pts_per_bin.argmax(axis=1)
+    max_pts_total = pts_per_bin[windows, mode_bin]
+    max_bin_ratio = max_pts_total / pts_per_bin.mean(axis=1)
+
+    is_pause = ~(
+        (mode_bin < lower_bins)
+        | (mode_bin > upper_bins)
+        | (max_bin_ratio < min_bins_for_pause)
+    )
+
+    extrema_onsets = np.empty((n_windows,), dtype=np.int64)
+    pause_onsets = np.full((n_windows,), MISSING, dtype=np.int64)
+
+    for window in np.flatnonzero(is_pause):
+        w_samples = samples[w_offsets[window] : w_offsets[window] + w_lengths[window]]
+        min_bin, max_bin = _pause_bins(
+            pts_per_bin[window],
+            mode_bin[window],
+            max_pause_bins,
+            BINNING_THRES,
+            backend=backend,
+        )
+        first, last = _pause_bounds(
+            w_samples,
+            _bin_edge(min_bin, edge_min[window], edge_step[window]),
+            (
+                _bin_edge(max_bin, edge_min[window], edge_step[window])
+                if max_bin < n_bins - 1
+                else edge_max[window]
+            ),
+            backend=backend,
+        )
+
+        # No sample lies strictly inside the pause range
+        if first < 0:
+            is_pause[window] = False
+            continue
+
+        extrema_onsets[window] = w_starts[window] + last + 1
+        pause_onsets[window] = w_starts[window] + first - 1
+
+    # Last sample below the zero crossing for inhales, above for exhales
+    is_crossed = (samples <= signal_zero_cross) == np.repeat(is_inhale, w_lengths)
+    last_cross = np.maximum.reduceat(np.where(is_crossed, sample_idx, -1), w_offsets)
+    extrema_onsets[~is_pause] = np.where(last_cross >= 0, last_cross, w_starts)[
+        ~is_pause
+    ]
+
+    return extrema_onsets, pause_onsets
+
+
+def find_extrema_pause_onsets(
+    y,
+    w_starts,
+    w_stops,
+    is_inhale,
+    n_bins,
+    upper_bins,
+    lower_bins,
+    min_bins_for_pause,
+    max_pause_bins,
+    signal_zero_cross,
+    backend=None,
+):
+    w_lengths = w_stops - w_starts
+    if np.any(w_lengths <= 0):
+        raise ValueError("Expected every breath window to hold at least one sample")
+
+    is_inhale = np.broadcast_to(is_inhale, w_starts.shape)
+
+    extrema_onsets = np.empty(w_starts.shape, dtype=np.int64)
+    pause_onsets = np.empty(w_starts.shape, dtype=np.int64)
+
+    # Processes windows in groups of about BLOCK_SIZE samples to bound memory
+    cum_lengths = np.cumsum(w_lengths)
+    start = 0
+    while start < w_starts.shape[0]:
+        stop = np.searchsorted(
+            cum_lengths, cum_lengths[start] - w_lengths[start] + BLOCK_SIZE, "right"
+        )
+        stop = max(stop, start + 1)
 
+        (
+            extrema_onsets[start:stop],
+            pause_onsets[start:stop],
+        ) = _segment_pause_onsets(
+            y,
+            w_starts[start:stop],
+            w_stops[start:stop],
+            is_inhale[start:stop],
+            n_bins,
+            upper_bins,
+            lower_bins,
+            min_bins_for_pause,
+            max_pause_bins,
+            signal_zero_cross,
+            backend,
+        )
+        start = stop
+
+    return extrema_onsets, pause_onsets
+
+
+def find_pause_onsets(
+    y, w_starts, w_stops, is_inhale, n_bins, signal_zero_cross, backend=None
+):
+    # n_bins is one number of bins per window, or one for all of them. Windows
+    # with the same number of bins are processed together
+    n_bins = np.broadcast_to(n_bins, w_starts.shape)
+    is_inhale = np.broadcast_to(is_inhale, w_starts.shape)
+
+    extrema_onsets = np.empty(w_starts.shape, dtype=np.int64)
+    pause_onsets = np.empty(w_starts.shape, dtype=np.int64)
+    for level in np.unique(n_bins):
+        windows = np.flatnonzero(n_bins == level)
+        extrema_onsets[windows], pause_onsets[windows] = find_extrema_pause_onsets(
+            y,
+            w_starts[windows],
+            w_stops[windows],
+            is_inhale[windows],
+            *find_bin_params(int(level)),
+            signal_zero_cross,
+            backend,
+        )
+
+    return extrema_onsets, pause_onsets
+
+
+def find_n_bins(w_lengths, sr=None):
+    # Most bins of BIN_LEVELS that leave MIN_PTS_PER_BIN samples per bin on
+    # average, so short windows are not spread over mostly empty bins, and at
+    # most 50 at or below LOW_SR
+    levels = np.array(BIN_LEVELS)
+    if sr is not None and sr <= LOW_SR:
+        levels = levels[levels < N_BINS]
+
+    level = np.searchsorted(levels * MIN_PTS_PER_BIN, w_lengths, "right") - 1
+    return levels[np.maximum(level, 0)]
+
+
+def find_bin_params(n_bins=N_BINS):
     max_pause_bins = 5 if n_bins >= 100 else 2
 
     min_bins_for_pause = 5
     upper_bins = round(n_bins * 0.7)
     lower_bins = round(n_bins * 0.3)
-    signal_zero_cross = y.mean()
 
-    inhale_onsets = np.empty(peaks_idx.shape).astype(int)
-    inhale_pause_onsets = np.empty(peaks_idx.shape)
-    inhale_pause_onsets[:] = np.nan
-    exhale_onsets = np.empty(troughs_idx.shape).astype(int)
-    exhale_pause_onsets = np.empty(troughs_idx.shape)
-    exhale_pause_onsets[:] = np.nan
+    return n_bins, upper_bins, lower_bins, min_bins_for_pause, max_pause_bins
 
-    # First inhale onset:
+
+def find_onset_boundaries(peaks_idx, n_samples):
     avg_breath_dur = floor(
         np.array(
             [peaks_idx[i + 1] - peaks_idx[i] for i in range(len(peaks_idx) - 1)]
@@ -94,7 +396,16 @@ def find_onsets(y, peaks_idx, troughs_idx):
         0 if peaks_idx[0] <= avg_breath_dur else peaks_idx[0] % avg_breath_dur
     )
 
-    window = y[first_zero_cross_boundary : peaks_idx[0]]
+    if n_samples - peaks_idx[-1] > avg_breath_dur:
+        last_zero_cross_boundary = peaks_idx[-1] + avg_breath_dur
+    else:
+        last_zero_cross_boundary = n_samples - 1
+
+    return first_zero_cross_boundary, last_zero_cross_boundary
+
+
+def find_first_inhale_onset(window, window_start, signal_zero_cross, n_bins=N_BINS):
+    n_bins, upper_bins, lower_bins, _, _ = find_bin_params(n_bins)
     _, bin_edges, mode_bin = hist(window, n_bins)
 
     zero_cross_threshold = (
@@ -104,81 +415,158 @@ def find_onsets(y, peaks_idx, troughs_idx):
     )
 
     first_potential_inhale = np.where(window < zero_cross_threshold)[0]
-    inhale_onsets[0] = first_zero_cross_boundary + (
+    return window_start + (
         first_potential_inhale[-1] if len(first_potential_inhale) > 0 else 0
     )
 
+
+def find_last_exhale_onset(window, window_start, signal_zero_cross):
+    last_potential_exhale = np.where(window < signal_zero_cross)[0]
+
+    return window_start + (
+        last_potential_exhale[0] if len(last_potential_exhale) > 0 else window.shape[0]
+    )
+
+
+@instrument("onset_offset_detection.find_onsets")
+def find_onsets(
+    y, peaks_idx, troughs_idx, backend=None, batched=True, sr=None, n_bins=None
+):
+    # Each window gets its number of bins from its length and sr, unless n_bins
+    # is given
+    signal_zero_cross = y.mean()
+
+    inhale_onsets = np.empty(peaks_idx.shape, dtype=np.int64)
+    inhale_pause_onsets = np.full(peaks_idx.shape, MISSING, dtype=np.int64)
+    exhale_onsets = np.empty(troughs_idx.shape, dtype=np.int64)
+    exhale_pause_onsets = np.full(troughs_idx.shape, MISSING, dtype=np.int64)
+
+    # First inhale onset:
+    first_zero_cross_boundary, last_zero_cross_boundary = find_onset_boundaries(
+        peaks_idx, y.shape[0]
+    )
+    first_window = y[first_zero_cross_boundary : peaks_idx[0]]
+    inhale_onsets[0] = find_first_inhale_onset(
+        first_window,
+        first_zero_cross_boundary,
+        signal_zero_cross,
+        find_n_bins(first_window.shape[0], sr) if n_bins is None else n_bins,
+    )
+
+    # Exhale and inhale windows alternate and tile y from the first peak
+    n_breaths = len(peaks_idx) - 1
+    w_starts = np.empty((2 * n_breaths,), dtype=int)
+    w_starts[0::2] = peaks_idx[:-1]
+    w_starts[1::2] = troughs_idx[:n_breaths]
+    w_stops = np.empty((2 * n_breaths,), dtype=int)
+    w_stops[0::2] = troughs_idx[:n_breaths]
+    w_stops[1::2] = peaks_idx[1:]
+    w_bins = np.broadcast_to(
+        find_n_bins(w_stops - w_starts, sr) if n_bins is None else n_bins,
+        w_starts.shape,
+    )
+
     # Onsets peak-peak
-    for breath in range(len(peaks_idx) - 1):
-        inhale_window = y[troughs_idx[breath] : peaks_idx[breath + 1]]
-        (
-            inhale_onsets[breath + 1],
-            exhale_pause_onsets[breath],
-        ) = find_extrema_pause_onset(
-            inhale_window,
-            troughs_idx[breath],
-            True,
-            n_bins,
-            upper_bins,
-            lower_bins,
-            min_bins_for_pause,
-            max_pause_bins,
+    if batched:
+        extrema_onsets, pause_onsets = find_pause_onsets(
+            y,
+            w_starts,
+            w_stops,
+            np.arange(2 * n_breaths) % 2 == 1,
+            w_bins,
             signal_zero_cross,
+            backend,
         )
 
-        exhale_window = y[peaks_idx[breath] : troughs_idx[breath]]
-        exhale_onsets[breath], inhale_pause_onsets[breath] = find_extrema_pause_onset(
-            exhale_window,
-            peaks_idx[breath],
-            False,
-            n_bins,
-            upper_bins,
-            lower_bins,
-            min_bins_for_pause,
-            max_pause_bins,
-            signal_zero_cross,
-        )
+        exhale_onsets[:n_breaths] = extrema_onsets[0::2]
+        inhale_pause_onsets[:n_breaths] = pause_onsets[0::2]
+        inhale_onsets[1:] = extrema_onsets[1::2]
+        exhale_pause_onsets[:n_breaths] = pause_onsets[1::2]
 
-    # Last exhale onset:
-    if y.shape[0] - peaks_idx[-1] > avg_breath_dur:
-        last_zero_cross_boundary = peaks_idx[-1] + avg_breath_dur
     else:
-        last_zero_cross_boundary = y.shape[0] - 1
+        for breath in range(n_breaths):
+            inhale_window = y[troughs_idx[breath] : peaks_idx[breath + 1]]
+            (
+                inhale_onsets[breath + 1],
+                exhale_pause_onsets[breath],
+            ) = find_extrema_pause_onset(
+                inhale_window,
+                troughs_idx[breath],
+                True,
+                *find_bin_params(int(w_bins[2 * breath + 1])),
+                signal_zero_cross,
+                backend,
+            )
+
+            exhale_window = y[peaks_idx[breath] : troughs_idx[breath]]
+            exhale_onsets[breath], inhale_pause_onsets[breath] = (
+                find_extrema_pause_onset(
+                    exhale_window,
+                    peaks_idx[breath],
+                    False,
+                    *find_bin_params(int(w_bins[2 * breath])),
+                    signal_zero_cross,
+                    backend,
+                )
+            )
 
-    exhale_window = y[peaks_idx[-1] : last_zero_cross_boundary]
-    last_potential_exhale = np.where(exhale_window < signal_zero_cross)[0]
-
-    exhale_onsets[-1] = (
-        peaks_idx[-1] + last_potential_exhale[0]
-        if len(last_potential_exhale) > 0
-        else last_zero_cross_boundary
+    # Last exhale onset:
+    exhale_onsets[-1] = find_last_exhale_onset(
+        y[peaks_idx[-1] : last_zero_cross_boundary], peaks_idx[-1], signal_zero_cross
     )
 
     return inhale_onsets, exhale_onsets, inhale_pause_onsets, exhale_pause_onsets
 
 
+def is_missing(idx):
+    # MISSING for indices stored as ints, NaN for indices stored as floats
+    idx = np.asarray(idx)
+    return np.isnan(idx) if idx.dtype.kind == "f" else idx == MISSING
+
+
+def find_offsets_from_onsets(
+    inhale_onsets, exhale_onsets, inhale_pause_onsets, exhale_pause_onsets
+):
+    # Every offset but the last exhale one ends where a pause or the next phase
+    # starts
+    inhale_offsets = (
+        np.where(is_missing(inhale_pause_onsets), exhale_onsets, inhale_pause_onsets)
+        - 1
+    ).astype(np.int64)
+
+    exhale_offsets = np.full(exhale_onsets.shape, MISSING, dtype=np.int64)
+    exhale_offsets[:-1] = (
+        np.where(
+            is_missing(exhale_pause_onsets[:-1]),
+            inhale_onsets[1:],
+            exhale_pause_onsets[:-1],
+        )
+        - 1
+    )
+
+    return inhale_offsets, exhale_offsets
+
+
+@instrument("onset_offset_detection.find_offsets")
 def find_offsets(
     y, inhale_onsets, exhale_onsets, inhale_pause_onsets, exhale_pause_onsets
 ):
-    inhale_offsets = np.zeros(inhale_onsets.shape)
-    exhale_offsets = np.zeros(exhale_onsets.shape)
-
-    for breath in range(len(exhale_onsets)):
-        if np.isnan(inhale_pause_onsets[breath]):
-            inhale_offsets[breath] = exhale_onsets[breath] - 1
-        else:
-            inhale_offsets[breath] = inhale_pause_onsets[breath] - 1
-
-    for breath in range(len(exhale_onsets) - 1):
-        if np.isnan(exhale_pause_onsets[breath]):
-            exhale_offsets[breath] = inhale_onsets[breath + 1] - 1
-        else:
-            exhale_offsets[breath] = exhale_pause_onsets[breath] - 1
-
-    final_window = y[exhale_onsets[-1] :]
+    inhale_offsets, exhale_offsets = find_offsets_from_onsets(
+        inhale_onsets, exhale_onsets, inhale_pause_onsets, exhale_pause_onsets
+    )
+
+    exhale_offsets[-1] = find_last_exhale_offset(
+        y[exhale_onsets[-1] :],
+        exhale_onsets[-1],
+        (exhale_offsets[:-1] - exhale_onsets[:-1]).mean(),
+    )
+
+    return inhale_offsets, exhale_offsets
+
+
+def find_last_exhale_offset(final_window, last_exhale_onset, avg_exhale_dur):
     potential_exhale_offset = np.where(final_window > 0)[0]
 
-    avg_exhale_dur = (exhale_offsets[:-1] - exhale_onsets[:-1]).mean()
     lower_lim = avg_exhale_dur / 4
     upper_lim = avg_exhale_dur * 1.75
 
@@ -187,8 +575,5 @@ def find_offsets(
         or potential_exhale_offset[0] < lower_lim
         or potential_exhale_offset[0] > upper_lim
     ):
-        exhale_offsets[-1] = np.nan
-    else:
-        exhale_offsets[-1] = exhale_onsets[-1] + potential_exhale_offset[0] - 1
-
-    return inhale_offsets, exhale_offsets
+        return MISSING
+    return last_exhale_onset + potential_exhale_offset[0] - 1
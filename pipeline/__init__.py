@@ -0,0 +1,14 @@
+from ._pipeline import BreathMetrics
+from ._batch import process_signals
+from ._chunked import process_chunked
+from ._streaming import StreamingBreathDetector
+from ._cache import CACHE_SIZE, DiskCache
+
+__all__ = [
+    "BreathMetrics",
+    "process_signals",
+    "process_chunked",
+    "StreamingBreathDetector",
+    "CACHE_SIZE",
+    "DiskCache",
+]
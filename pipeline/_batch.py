@@ -0,0 +1,140 @@
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from preprocess import mean_smooth, remove_global_drift, decimation_factor, decimate
+from metrics import BREATH_DTYPE
+from ._pipeline import (
+    DEFAULT_PARAMS,
+    BreathMetrics,
+    map_to_full_rate,
+    find_breaths,
+    find_metrics,
+)
+
+BREATH_FIELDS = BREATH_DTYPE.names
+METRIC_FIELDS = (
+    "breathing_rate",
+    "interbreath_interval",
+    "coef_var_breathing_rate",
+    "tidal_volume",
+    "minute_ventilation",
+    "duty_cycle",
+    "coef_var_duty_cycle",
+    "coef_var_breath_volumes",
+)
+
+
+def preprocess_signals(signals, sr, smooth_window_ms, drift_order, dtype=np.float64):
+    # Signals of the same length are stacked and preprocessed in one call
+    detrended = [None] * len(signals)
+
+    lengths = np.array([signal.shape[0] for signal in signals])
+    for length in np.unique(lengths):
+        group = np.flatnonzero(lengths == length)
+        y = np.stack([signals[i] for i in group]).astype(dtype)
+
+        if smooth_window_ms is not None:
+            y = mean_smooth(y, sr, smooth_window_ms, mode="same", dtype=dtype)
+        if drift_order is not None:
+            y = remove_global_drift(y, drift_order, out=y, dtype=dtype)
+
+        for i, signal in zip(group, y):
+            detrended[i] = signal
+
+    return detrended
+
+
+def _detect(
+    y, sr, backend, window_sizes_ms, shift, dtype, full_y=None, factor=1, refine=True
+):
+    # y may be full_y decimated by factor, sr is the rate of full_y
+    bm = BreathMetrics(
+        y,
+        sr / factor,
+        backend,
+        smooth_window_ms=None,
+        drift_order=None,
+        window_sizes_ms=window_sizes_ms,
+        shift=shift,
+        dtype=dtype,
+    )
+    if factor == 1:
+        return bm.breaths, bm.metrics
+
+    breaths = find_breaths(
+        sr,
+        *map_to_full_rate(
+            full_y, factor, *bm.extrema, *bm.onsets, *bm.offsets, refine=refine
+        ),
+        *bm.volumes,
+    )
+    return breaths, find_metrics(breaths)
+
+
+def _records(results):
+    signal_breaths = [breaths for breaths, _ in results]
+    signal_metrics = [metrics for _, metrics in results]
+    n_breaths = [len(breaths) for breaths in signal_breaths]
+
+    breath_dtype = [("signal", np.int64)] + BREATH_DTYPE.descr
+    breaths = np.empty((sum(n_breaths),), dtype=breath_dtype)
+    breaths["signal"] = np.repeat(np.arange(len(results)), n_breaths)
+    if results:
+        for field in BREATH_FIELDS:
+            breaths[field] = np.concatenate([b[field] for b in signal_breaths])
+
+    metrics = np.empty((len(results),), dtype=[(f, float) for f in METRIC_FIELDS])
+    for field in METRIC_FIELDS:
+        metrics[field] = [m[field] for m in signal_metrics]
+
+    return breaths, metrics
+
+
+def process_signals(signals, sr, n_workers=None, backend=None, **params):
+    unknown = set(params) - set(DEFAULT_PARAMS)
+    if unknown:
+        raise ValueError(f"Unknown parameters {sorted(unknown)}")
+    params = {**DEFAULT_PARAMS, **params}
+
+    # A 2-D array holds one signal per row, a list may hold ragged signals
+    if isinstance(signals, np.ndarray):
+        if signals.ndim != 2:
+            raise ValueError(f"Expected a 2-D array, got {signals.ndim} dimensions")
+    signals = [np.asarray(signal) for signal in signals]
+
+    # Signals are decimated before preprocessing, and the full rate signals are
+    # only sent to the workers to map breaths back onto them
+    factor = decimation_factor(sr, params["decimate_sr"])
+    decimated = signals
+    if factor > 1:
+        decimated = [
+            decimate(signal, factor, dtype=params["dtype"]) for signal in signals
+        ]
+
+    detrended = preprocess_signals(
+        decimated,
+        sr / factor,
+        params["smooth_window_ms"],
+        params["drift_order"],
+        params["dtype"],
+    )
+
+    args = (
+        detrended,
+        [sr] * len(signals),
+        [backend] * len(signals),
+        [params["window_sizes_ms"]] * len(signals),
+        [params["shift"]] * len(signals),
+        [params["dtype"]] * len(signals),
+        signals if factor > 1 else [None] * len(signals),
+        [factor] * len(signals),
+        [params["refine_extrema"]] * len(signals),
+    )
+    if n_workers == 1:
+        results = list(map(_detect, *args))
+    else:
+        with ProcessPoolExecutor(n_workers) as executor:
+            results = list(executor.map(_detect, *args))
+
+    # One record per breath, tagged with the index of its signal, and one record
+    # of metrics per signal
+    return _records(results)
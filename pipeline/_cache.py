@@ -0,0 +1,89 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import numpy as np
+
+CACHE_SIZE = 1 << 30  # bytes
+
+
+def signal_digest(y):
+    y = np.ascontiguousarray(y)
+    digest = hashlib.sha256(f"{y.dtype.str}{y.shape}".encode())
+    digest.update(memoryview(y).cast("B"))
+    return digest.hexdigest()
+
+
+def make_key(*parts):
+    return hashlib.sha256(repr(parts).encode()).hexdigest()
+
+
+# Content-addressed store of arrays on disk. Each entry is a directory named by
+# its key holding one .npy file per array. Entries are touched when read and the
+# least recently used ones are removed once the cache grows over max_bytes
+class DiskCache:
+    def __init__(self, path, max_bytes=CACHE_SIZE):
+        self.path = os.fspath(path)
+        self.max_bytes = max_bytes
+        os.makedirs(self.path, exist_ok=True)
+
+    def _entry(self, key):
+        return os.path.join(self.path, key)
+
+    def get(self, key):
+        entry = self._entry(key)
+        try:
+            names = sorted(os.listdir(entry), key=lambda name: int(name[:-4]))
+            arrays = [np.load(os.path.join(entry, name)) for name in names]
+            os.utime(entry)
+        except (FileNotFoundError, ValueError):
+            return None
+
+        return arrays
+
+    def put(self, key, arrays):
+        # Written to a temporary directory first so readers never see a partial
+        # entry. Another process may have stored the same key meanwhile
+        tmp_entry = tempfile.mkdtemp(dir=self.path, prefix=".tmp-")
+        for i, array in enumerate(arrays):
+            np.save(os.path.join(tmp_entry, f"{i}.npy"), array)
+
+        try:
+            os.rename(tmp_entry, self._entry(key))
+        except OSError:
+            shutil.rmtree(tmp_entry, ignore_errors=True)
+
+        self.evict()
+
+    def entries(self):
+        # (last use, size in bytes, key) of every entry
+        entries = []
+        for key in os.listdir(self.path):
+            entry = self._entry(key)
+            if key.startswith(".tmp-") or not os.path.isdir(entry):
+                continue
+
+            try:
+                size = sum(
+                    os.path.getsize(os.path.join(entry, name))
+                    for name in os.listdir(entry)
+                )
+                entries.append((os.path.getmtime(entry), size, key))
+            except FileNotFoundError:
+                continue
+
+        return entries
+
+    def evict(self):
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+
+        for _, size, key in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(self._entry(key), ignore_errors=True)
+            total -= size
+
+    def clear(self):
+        for _, _, key in self.entries():
+            shutil.rmtree(self._entry(key), ignore_errors=True)
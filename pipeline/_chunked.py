@@ -0,0 +1,345 @@
+import os
+import numpy as np
+from math import sqrt
+from preprocess import (
+    mean_smooth,
+    global_drift_normal_equations,
+    solve_global_drift,
+    eval_global_drift,
+    update_moments,
+)
+from extrema_detection import find_potential_extrema, pwct, correct_extrema
+from onset_offset_detection import (
+    MISSING,
+    is_missing,
+    find_n_bins,
+    find_pause_onsets,
+    find_onset_boundaries,
+    find_first_inhale_onset,
+    find_last_exhale_onset,
+    find_offsets_from_onsets,
+    find_last_exhale_offset,
+)
+from metrics import find_interval_bounds
+from signal_io import load_signal, scratch_array
+from ._pipeline import DEFAULT_PARAMS, find_breaths, find_metrics
+
+CHUNK_SIZE = 1 << 22  # samples
+
+
+# Preprocessed views of any part of a signal that only read that part and a
+# smoothing window around it, once the global drift and statistics are fitted
+class _ChunkedSignal:
+    def __init__(
+        self, y, sr, smooth_window_ms, drift_order, chunk_size, dtype=np.float64
+    ):
+        self.y = y
+        self.sr = sr
+        self.n_samples = y.shape[0]
+        self.smooth_window_ms = smooth_window_ms
+        self.drift_order = drift_order
+        self.chunk_size = chunk_size
+        self.dtype = np.dtype(dtype)
+
+        self._halo = (
+            0 if smooth_window_ms is None else max(int(sr / 1000 * smooth_window_ms), 1)
+        )
+        self._coefs = None
+        self._stored = None
+        self._mean = 0.0
+        self._std = 1.0
+
+    def chunks(self):
+        for start in range(0, self.n_samples, self.chunk_size):
+            yield start, min(start + self.chunk_size, self.n_samples)
+
+    def smoothed(self, start, stop):
+        lower = max(start - self._halo, 0)
+        upper = min(stop + self._halo, self.n_samples)
+        y = np.asarray(self.y[lower:upper], dtype=self.dtype)
+
+        if self.smooth_window_ms is None:
+            return y
+        return mean_smooth(
+            y, self.sr, self.smooth_window_ms, mode="same", dtype=self.dtype
+        )[start - lower : stop - lower]
+
+    def _detrend(self, smoothed, start, stop):
+        if self.drift_order is None:
+            return smoothed
+
+        drift = eval_global_drift(
+            self._coefs, start, stop, self.n_samples, self.drift_order
+        )
+        return (smoothed - drift).astype(self.dtype, copy=False)
+
+    def detrended(self, start, stop):
+        if self._stored is not None:
+            return np.array(self._stored[start:stop])
+        return self._detrend(self.smoothed(start, stop), start, stop)
+
+    def normalized(self, start, stop):
+        return (self.detrended(start, stop) - self._mean) / self._std
+
+    def fit(self, scratch=None):
+        # The smoothed signal is written to a memory-mapped scratch file and
+        # detrended in place when asked, instead of being recomputed by every
+        # pass. scratch is True for a temporary file or the path of a .npy file
+        stored = None
+        if scratch is not None:
+            stored = scratch_array(
+                (self.n_samples,),
+                self.dtype,
+                path=None if scratch is True else scratch,
+            )
+
+        gram, rhs = 0, 0
+        for start, stop in self.chunks():
+            smoothed = self.smoothed(start, stop)
+            if stored is not None:
+                stored[start:stop] = smoothed
+
+            if self.drift_order is not None:
+                chunk_gram, chunk_rhs = global_drift_normal_equations(
+                    smoothed, start, self.n_samples, self.drift_order
+                )
+                gram += chunk_gram
+                rhs += chunk_rhs
+
+        if self.drift_order is not None:
+            self._coefs = solve_global_drift(gram, rhs)
+
+        count, mean, m2 = 0, 0.0, 0.0
+        for start, stop in self.chunks():
+            smoothed = (
+                stored[start:stop] if stored is not None else self.smoothed(start, stop)
+            )
+            detrended = self._detrend(smoothed, start, stop)
+            if stored is not None:
+                stored[start:stop] = detrended
+
+            count, mean, m2 = update_moments(count, mean, m2, detrended)
+
+        self._stored = stored
+        self._mean, self._std = mean, sqrt(m2 / count)
+
+
+def _find_extrema(signal, window_sizes_ms, shift, backend):
+    max_window = int(signal.sr / 1000 * max(window_sizes_ms))
+
+    peaks = [[] for _ in window_sizes_ms]
+    troughs = [[] for _ in window_sizes_ms]
+    candidates, values = [], []
+    normalized_sum = 0.0
+
+    # Windows starting in a chunk may reach into the next one by up to the
+    # largest window
+    for start, stop in signal.chunks():
+        normalized = signal.normalized(start, min(stop + max_window, signal.n_samples))
+        normalized_sum += normalized[: stop - start].sum()
+
+        w_peaks, w_troughs = find_potential_extrema(
+            normalized, signal.sr, window_sizes_ms, shift, offset=start, stop=stop
+        )
+        for w_size in range(len(window_sizes_ms)):
+            peaks[w_size].append(w_peaks[w_size])
+            troughs[w_size].append(w_troughs[w_size])
+
+        chunk_candidates = np.unique(np.concatenate(w_peaks + w_troughs))
+        candidates.append(chunk_candidates)
+        values.append(normalized[chunk_candidates - start])
+
+    peaks, troughs = pwct(
+        [np.concatenate(w_peaks) for w_peaks in peaks],
+        [np.concatenate(w_troughs) for w_troughs in troughs],
+        window_sizes_ms,
+        shift,
+    )
+
+    # Only the values of the potential extrema are kept for the correction
+    candidates, first = np.unique(np.concatenate(candidates), return_index=True)
+    values = np.concatenate(values)[first]
+    peaks, troughs = correct_extrema(
+        peaks,
+        troughs,
+        values[np.searchsorted(candidates, peaks)],
+        values[np.searchsorted(candidates, troughs)],
+        backend,
+    )
+
+    return peaks, troughs, normalized_sum / signal.n_samples
+
+
+def _find_onsets(signal, peaks, troughs, signal_zero_cross, backend):
+    inhale_onsets = np.empty(peaks.shape, dtype=np.int64)
+    inhale_pause_onsets = np.full(peaks.shape, MISSING, dtype=np.int64)
+    exhale_onsets = np.empty(troughs.shape, dtype=np.int64)
+    exhale_pause_onsets = np.full(troughs.shape, MISSING, dtype=np.int64)
+
+    first_zero_cross_boundary, last_zero_cross_boundary = find_onset_boundaries(
+        peaks, signal.n_samples
+    )
+    inhale_onsets[0] = find_first_inhale_onset(
+        signal.normalized(first_zero_cross_boundary, peaks[0]),
+        first_zero_cross_boundary,
+        signal_zero_cross,
+        find_n_bins(peaks[0] - first_zero_cross_boundary, signal.sr),
+    )
+
+    # Exhale and inhale windows alternate from the first peak, and are read in
+    # groups of the windows starting in each chunk
+    n_breaths = len(peaks) - 1
+    w_starts = np.empty((2 * n_breaths,), dtype=int)
+    w_starts[0::2] = peaks[:-1]
+    w_starts[1::2] = troughs[:n_breaths]
+    w_stops = np.empty((2 * n_breaths,), dtype=int)
+    w_stops[0::2] = troughs[:n_breaths]
+    w_stops[1::2] = peaks[1:]
+    is_inhale = np.arange(2 * n_breaths) % 2 == 1
+    n_bins = find_n_bins(w_stops - w_starts, signal.sr)
+
+    extrema_onsets = np.empty((2 * n_breaths,), dtype=np.int64)
+    pause_onsets = np.empty((2 * n_breaths,), dtype=np.int64)
+    for start, stop in signal.chunks():
+        lower, upper = np.searchsorted(w_starts, [start, stop])
+        if lower == upper:
+            continue
+
+        base = w_starts[lower]
+        extrema_onsets[lower:upper], pause_onsets[lower:upper] = find_pause_onsets(
+            signal.normalized(base, w_stops[upper - 1]),
+            w_starts[lower:upper] - base,
+            w_stops[lower:upper] - base,
+            is_inhale[lower:upper],
+            n_bins[lower:upper],
+            signal_zero_cross,
+            backend,
+        )
+        extrema_onsets[lower:upper] += base
+        pause_onsets[lower:upper] += np.where(
+            is_missing(pause_onsets[lower:upper]), 0, base
+        )
+
+    exhale_onsets[:n_breaths] = extrema_onsets[0::2]
+    inhale_pause_onsets[:n_breaths] = pause_onsets[0::2]
+    inhale_onsets[1:] = extrema_onsets[1::2]
+    exhale_pause_onsets[:n_breaths] = pause_onsets[1::2]
+
+    exhale_onsets[-1] = find_last_exhale_onset(
+        signal.normalized(peaks[-1], last_zero_cross_boundary),
+        peaks[-1],
+        signal_zero_cross,
+    )
+
+    return inhale_onsets, exhale_onsets, inhale_pause_onsets, exhale_pause_onsets
+
+
+def _find_offsets(signal, inhale_onsets, exhale_onsets, *pause_onsets):
+    inhale_offsets, exhale_offsets = find_offsets_from_onsets(
+        inhale_onsets, exhale_onsets, *pause_onsets
+    )
+
+    # Samples past 1.75 times the average exhale cannot be the last offset
+    avg_exhale_dur = (exhale_offsets[:-1] - exhale_onsets[:-1]).mean()
+    stop = signal.n_samples
+    if np.isfinite(avg_exhale_dur):
+        stop = min(stop, exhale_onsets[-1] + int(avg_exhale_dur * 1.75) + 2)
+
+    exhale_offsets[-1] = find_last_exhale_offset(
+        signal.normalized(exhale_onsets[-1], stop), exhale_onsets[-1], avg_exhale_dur
+    )
+
+    return inhale_offsets, exhale_offsets
+
+
+def _find_volumes(signal, inhale_onsets, exhale_onsets, inhale_offsets, exhale_offsets):
+    inhale_stops, is_inhale_valid = find_interval_bounds(
+        inhale_onsets, inhale_offsets, signal.n_samples
+    )
+    exhale_stops, is_exhale_valid = find_interval_bounds(
+        exhale_onsets, exhale_offsets, signal.n_samples
+    )
+
+    # Cumulative sum of abs(y) at every interval bound, carried across chunks
+    bounds = np.concatenate((inhale_onsets, inhale_stops, exhale_onsets, exhale_stops))
+    order = np.argsort(bounds, kind="stable")
+    sorted_bounds = bounds[order]
+
+    abs_cumsum = np.empty(bounds.shape)
+    carry = 0.0
+    for start, stop in signal.chunks():
+        chunk_cumsum = np.zeros((stop - start + 1,))
+        np.abs(signal.detrended(start, stop), out=chunk_cumsum[1:])
+        np.cumsum(chunk_cumsum, out=chunk_cumsum)
+
+        lower, upper = np.searchsorted(sorted_bounds, [start, stop])
+        abs_cumsum[order[lower:upper]] = (
+            carry + chunk_cumsum[sorted_bounds[lower:upper] - start]
+        )
+        carry += chunk_cumsum[-1]
+    abs_cumsum[order[np.searchsorted(sorted_bounds, signal.n_samples) :]] = carry
+
+    n_breaths = inhale_onsets.shape[0]
+    inhale_sums = abs_cumsum[n_breaths : 2 * n_breaths] - abs_cumsum[:n_breaths]
+    exhale_sums = (
+        abs_cumsum[3 * n_breaths :] - abs_cumsum[2 * n_breaths : 3 * n_breaths]
+    )
+
+    inhale_volumes = np.where(is_inhale_valid, inhale_sums, np.nan) / signal.sr * 1000
+    exhale_volumes = np.where(is_exhale_valid, exhale_sums, np.nan) / signal.sr * 1000
+
+    return inhale_volumes, exhale_volumes
+
+
+def process_chunked(y, sr, chunk_size=CHUNK_SIZE, backend=None, scratch=None, **params):
+    # .npy paths are memory-mapped, raw files go through load_signal first
+    if isinstance(y, (str, os.PathLike)):
+        y = load_signal(y)
+
+    unknown = set(params) - set(DEFAULT_PARAMS)
+    if unknown:
+        raise ValueError(f"Unknown parameters {sorted(unknown)}")
+    params = {**DEFAULT_PARAMS, **params}
+    if params["decimate_sr"] is not None:
+        raise ValueError("Decimation is not supported on chunked signals")
+    window_sizes_ms = list(params["window_sizes_ms"])
+
+    # Every pass reads the signal one chunk at a time, so the peak memory
+    # depends on the chunk size and the number of breaths only
+    signal = _ChunkedSignal(
+        y,
+        sr,
+        params["smooth_window_ms"],
+        params["drift_order"],
+        chunk_size,
+        params["dtype"],
+    )
+    signal.fit(scratch)
+
+    peaks, troughs, signal_zero_cross = _find_extrema(
+        signal, window_sizes_ms, params["shift"], backend
+    )
+    inhale_onsets, exhale_onsets, inhale_pause_onsets, exhale_pause_onsets = (
+        _find_onsets(signal, peaks, troughs, signal_zero_cross, backend)
+    )
+    inhale_offsets, exhale_offsets = _find_offsets(
+        signal, inhale_onsets, exhale_onsets, inhale_pause_onsets, exhale_pause_onsets
+    )
+    inhale_volumes, exhale_volumes = _find_volumes(
+        signal, inhale_onsets, exhale_onsets, inhale_offsets, exhale_offsets
+    )
+
+    breaths = find_breaths(
+        sr,
+        peaks,
+        troughs,
+        inhale_onsets,
+        exhale_onsets,
+        inhale_pause_onsets,
+        exhale_pause_onsets,
+        inhale_offsets,
+        exhale_offsets,
+        inhale_volumes,
+        exhale_volumes,
+    )
+    return breaths, find_metrics(breaths)
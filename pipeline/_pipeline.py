@@ -0,0 +1,342 @@
+import numpy as np
+from preprocess import (
+    SMOOTH_WINDOW,
+    DRIFT_ORDER,
+    mean_smooth,
+    remove_global_drift,
+    decimation_factor,
+    decimate,
+    to_full_rate,
+    refine_extrema,
+    z_score,
+)
+from extrema_detection import (
+    SHIFT,
+    WINDOW_SIZES,
+    find_potential_extrema,
+    pwct,
+    find_corrected_extrema,
+)
+from onset_offset_detection import find_onsets, find_offsets
+from metrics import (
+    find_volumes,
+    find_duration,
+    summarize,
+    BreathTable,
+)
+from ._cache import signal_digest, make_key
+
+DEFAULT_PARAMS = {
+    "smooth_window_ms": SMOOTH_WINDOW,
+    "drift_order": DRIFT_ORDER,
+    "window_sizes_ms": tuple(WINDOW_SIZES),
+    "shift": SHIFT,
+    "dtype": np.dtype(np.float64),
+    "decimate_sr": None,
+    "refine_extrema": True,
+}
+
+# Parameters and upstream stages each stage depends on, in computation order
+STAGES = {
+    "decimated": ("decimate_sr", "dtype"),
+    "smoothed": ("decimated", "smooth_window_ms"),
+    "detrended": ("smoothed", "drift_order"),
+    "normalized": ("detrended",),
+    "potential_extrema": ("normalized", "window_sizes_ms", "shift"),
+    "extrema": ("potential_extrema",),
+    "onsets": ("extrema",),
+    "offsets": ("onsets",),
+    "volumes": ("detrended", "offsets"),
+    "breaths": ("volumes", "refine_extrema"),
+    "metrics": ("breaths",),
+}
+
+
+def _pair_of_lists(arrays):
+    n = len(arrays) // 2
+    return list(arrays[:n]), list(arrays[n:])
+
+
+# Stages stored in a disk cache, with how their value is written as a list of
+# arrays and read back
+DISK_STAGES = {
+    "smoothed": (lambda value: [value], lambda arrays: arrays[0]),
+    "detrended": (lambda value: [value], lambda arrays: arrays[0]),
+    "normalized": (lambda value: [value], lambda arrays: arrays[0]),
+    "potential_extrema": (lambda value: [*value[0], *value[1]], _pair_of_lists),
+    "extrema": (list, tuple),
+    "onsets": (list, tuple),
+    "offsets": (list, tuple),
+    "volumes": (list, tuple),
+}
+
+
+def stage_params(stage):
+    # Parameters a stage depends on, directly or through upstream stages
+    params = set()
+    for dependency in STAGES[stage]:
+        params |= stage_params(dependency) if dependency in STAGES else {dependency}
+    return params
+
+
+# Lazy breath detection pipeline over one respiration signal. Each stage is
+# computed once on first access, and set_params only drops the stages downstream
+# of the parameters that changed. Extrema, onsets and offsets are detected on the
+# z-scored signal while volumes are measured on the detrended one to keep its
+# units. Setting smooth_window_ms or drift_order to None skips that step, and
+# dtype sets the floating point type of the preprocessed signals. With
+# decimate_sr, every stage up to volumes runs on y decimated to at least that
+# rate (detection_sr), and breaths maps their indices back to the samples of y,
+# moving peaks and troughs to the extrema of y around them with refine_extrema.
+# With a DiskCache, stages are also looked up on disk by the content of the
+# signal, the sampling rate and the parameters they depend on.
+class BreathMetrics:
+    def __init__(self, y, sr, backend=None, cache=None, **params):
+        self.y = np.asarray(y)
+        self.sr = sr
+        self.backend = backend
+        self.cache = cache
+
+        self._params = dict(DEFAULT_PARAMS)
+        self._cache = {}
+        self._digest = None
+        self.set_params(**params)
+
+    def get_params(self):
+        return dict(self._params)
+
+    def set_params(self, **params):
+        unknown = set(params) - set(self._params)
+        if unknown:
+            raise ValueError(f"Unknown parameters {sorted(unknown)}")
+
+        if "window_sizes_ms" in params:
+            params["window_sizes_ms"] = tuple(
+                WINDOW_SIZES
+                if params["window_sizes_ms"] is None
+                else params["window_sizes_ms"]
+            )
+        if "dtype" in params:
+            params["dtype"] = np.dtype(params["dtype"])
+
+        changed = {
+            name for name, value in params.items() if self._params[name] != value
+        }
+        self._params.update(params)
+
+        for stage, dependencies in STAGES.items():
+            if changed.intersection(dependencies):
+                changed.add(stage)
+                self._cache.pop(stage, None)
+
+        return self
+
+    def _stage(self, stage):
+        if stage not in self._cache:
+            self._cache[stage] = self._load_or_compute(stage)
+        return self._cache[stage]
+
+    def _load_or_compute(self, stage):
+        compute = getattr(self, f"_compute_{stage}")
+        if self.cache is None or stage not in DISK_STAGES:
+            return compute()
+
+        if self._digest is None:
+            self._digest = signal_digest(self.y)
+        key = make_key(
+            self._digest,
+            self.sr,
+            stage,
+            [(name, self._params[name]) for name in sorted(stage_params(stage))],
+        )
+
+        to_arrays, from_arrays = DISK_STAGES[stage]
+        arrays = self.cache.get(key)
+        if arrays is not None:
+            return from_arrays(arrays)
+
+        value = compute()
+        self.cache.put(key, to_arrays(value))
+        return value
+
+    @property
+    def factor(self):
+        return decimation_factor(self.sr, self._params["decimate_sr"])
+
+    @property
+    def detection_sr(self):
+        return self.sr / self.factor
+
+    @property
+    def decimated(self):
+        return self._stage("decimated")
+
+    @property
+    def smoothed(self):
+        return self._stage("smoothed")
+
+    @property
+    def detrended(self):
+        return self._stage("detrended")
+
+    @property
+    def normalized(self):
+        return self._stage("normalized")
+
+    @property
+    def potential_extrema(self):
+        return self._stage("potential_extrema")
+
+    @property
+    def extrema(self):
+        return self._stage("extrema")
+
+    @property
+    def onsets(self):
+        return self._stage("onsets")
+
+    @property
+    def offsets(self):
+        return self._stage("offsets")
+
+    @property
+    def volumes(self):
+        return self._stage("volumes")
+
+    @property
+    def breaths(self):
+        return self._stage("breaths")
+
+    @property
+    def metrics(self):
+        return self._stage("metrics")
+
+    def _compute_decimated(self):
+        if self.factor == 1:
+            return self.y
+        return decimate(self.y, self.factor, dtype=self._params["dtype"])
+
+    def _compute_smoothed(self):
+        if self._params["smooth_window_ms"] is None:
+            return self.decimated.astype(self._params["dtype"], copy=False)
+        return mean_smooth(
+            self.decimated,
+            self.detection_sr,
+            self._params["smooth_window_ms"],
+            mode="same",
+            dtype=self._params["dtype"],
+        )
+
+    def _compute_detrended(self):
+        if self._params["drift_order"] is None:
+            return self.smoothed
+        return remove_global_drift(
+            self.smoothed, self._params["drift_order"], dtype=self._params["dtype"]
+        )
+
+    def _compute_normalized(self):
+        return z_score(self.detrended)
+
+    def _compute_potential_extrema(self):
+        return find_potential_extrema(
+            self.normalized,
+            self.detection_sr,
+            list(self._params["window_sizes_ms"]),
+            self._params["shift"],
+        )
+
+    def _compute_extrema(self):
+        peaks, troughs = pwct(
+            *self.potential_extrema,
+            self._params["window_sizes_ms"],
+            self._params["shift"],
+        )
+        return find_corrected_extrema(self.normalized, peaks, troughs, self.backend)
+
+    def _compute_onsets(self):
+        return find_onsets(
+            self.normalized, *self.extrema, self.backend, sr=self.detection_sr
+        )
+
+    def _compute_offsets(self):
+        return find_offsets(self.normalized, *self.onsets)
+
+    def _compute_volumes(self):
+        inhale_onsets, exhale_onsets, _, _ = self.onsets
+        inhale_offsets, exhale_offsets = self.offsets
+        return find_volumes(
+            self.detrended,
+            self.detection_sr,
+            inhale_onsets,
+            inhale_offsets,
+            exhale_onsets,
+            exhale_offsets,
+        )
+
+    def _compute_breaths(self):
+        return find_breaths(
+            self.sr,
+            *map_to_full_rate(
+                self.y,
+                self.factor,
+                *self.extrema,
+                *self.onsets,
+                *self.offsets,
+                refine=self._params["refine_extrema"],
+            ),
+            *self.volumes,
+        )
+
+    def _compute_metrics(self):
+        return find_metrics(self.breaths)
+
+
+def map_to_full_rate(y, factor, peaks, troughs, *indices, refine=True):
+    # Peaks, troughs and other indices detected on y decimated by factor, as
+    # samples of y. refine moves peaks and troughs to the extrema of y around them
+    if factor == 1:
+        return (peaks, troughs, *indices)
+
+    n_samples = y.shape[0]
+    peaks, troughs, *indices = [
+        to_full_rate(idx, factor, n_samples) for idx in [peaks, troughs, *indices]
+    ]
+    if refine:
+        peaks = refine_extrema(y, peaks, factor, find_max=True)
+        troughs = refine_extrema(y, troughs, factor, find_max=False)
+
+    return (peaks, troughs, *indices)
+
+
+def find_breaths(
+    sr,
+    peaks,
+    troughs,
+    inhale_onsets,
+    exhale_onsets,
+    inhale_pause_onsets,
+    exhale_pause_onsets,
+    inhale_offsets,
+    exhale_offsets,
+    inhale_volumes,
+    exhale_volumes,
+):
+    return BreathTable.from_columns(
+        sr,
+        peaks=peaks,
+        troughs=troughs,
+        inhale_onsets=inhale_onsets,
+        exhale_onsets=exhale_onsets,
+        inhale_pause_onsets=inhale_pause_onsets,
+        exhale_pause_onsets=exhale_pause_onsets,
+        inhale_offsets=inhale_offsets,
+        exhale_offsets=exhale_offsets,
+        inhale_volumes=inhale_volumes,
+        exhale_volumes=exhale_volumes,
+        inhale_durations=find_duration(sr, inhale_onsets, inhale_offsets),
+        exhale_durations=find_duration(sr, exhale_onsets, exhale_offsets),
+    )
+
+
+def find_metrics(breaths):
+    return summarize(breaths)._asdict()
@@ -0,0 +1,359 @@
+import numpy as np
+from math import floor, sqrt
+from numpy.lib.stride_tricks import sliding_window_view
+from preprocess import SMOOTH_WINDOW, update_moments
+from extrema_detection import (
+    SHIFT,
+    WINDOW_SIZES,
+    count_votes,
+    find_hist_threshold,
+    find_corrected_extrema,
+)
+from onset_offset_detection import (
+    MISSING,
+    is_missing,
+    find_n_bins,
+    find_bin_params,
+    find_extrema_pause_onset,
+)
+from metrics import BREATH_DTYPE
+
+LOCAL_DRIFT_PERIOD = 60  # s
+
+
+# Keeps at least the last `capacity` samples of a stream contiguous in a buffer
+# twice that size, so slices never wrap around and each sample is copied at most
+# once more when the buffer fills up. Samples are addressed by absolute index.
+class _History:
+    def __init__(self, capacity, dtype=np.float64):
+        self.capacity = capacity
+        self.stop = 0
+
+        self._buffer = np.empty((2 * capacity,), dtype=dtype)
+        self._size = 0
+
+    @property
+    def start(self):
+        return self.stop - self._size
+
+    def extend(self, values):
+        n = values.shape[0]
+        if self._size + n > self._buffer.shape[0]:
+            keep = max(self.capacity - n, 0)
+            self._buffer[:keep] = self._buffer[self._size - keep : self._size]
+            self._size = keep
+
+        self._buffer[self._size : self._size + n] = values
+        self._size += n
+        self.stop += n
+
+    def get(self, start, stop):
+        if start < self.start or stop > self.stop:
+            raise ValueError(
+                f"Samples [{start}, {stop}) are not all in the history "
+                f"[{self.start}, {self.stop})"
+            )
+        return self._buffer[start - self.start : stop - self.start]
+
+
+# Detects breaths on a live signal pushed in chunks of any size. Samples are
+# processed in fixed pieces of at most the largest extrema window so the output
+# does not depend on how the stream is chunked. Smoothing is a causal moving
+# mean, local drift is the trailing mean over `period` seconds, and the signal
+# is z-scored with running statistics. Each breath is emitted once the next one
+# is confirmed, with indices counted from the first sample pushed. Pieces are
+# preprocessed in float64 and the signal history is kept in dtype.
+class StreamingBreathDetector:
+    def __init__(
+        self,
+        sr,
+        smooth_window_ms=SMOOTH_WINDOW,
+        period=LOCAL_DRIFT_PERIOD,
+        window_sizes_ms=None,
+        shift=SHIFT,
+        backend=None,
+        dtype=np.float64,
+    ):
+        if window_sizes_ms is None:
+            window_sizes_ms = WINDOW_SIZES
+
+        self.sr = sr
+        self.window_sizes_ms = tuple(window_sizes_ms)
+        self.shift = shift
+        self.backend = backend
+        self.n_samples = 0
+
+        self._smooth_size = (
+            1 if smooth_window_ms is None else max(int(sr / 1000 * smooth_window_ms), 1)
+        )
+        self._drift_size = max(floor(sr * period), 1)
+        self._window_sizes = np.floor(sr / 1000 * np.array(window_sizes_ms)).astype(int)
+        self._steps = np.maximum(self._window_sizes // shift, 1)
+        max_window = self._window_sizes.max()
+        self._piece_size = max(min(max_window, self._drift_size), 1)
+        self._pending = np.empty((0,))
+
+        # Preprocessing state
+        self._raw_tail = np.empty((0,))
+        self._smoothed = _History(self._drift_size)
+        self._drift_sum = 0.0
+        self._since_resync = 0
+        self._count, self._mean, self._m2 = 0, 0.0, 0.0
+        self._detrended = _History(self._drift_size + 2 * max_window, dtype)
+        self._normalized = _History(self._drift_size + 2 * max_window, dtype)
+
+        # Extrema of the windows whose candidates may still get votes
+        self._next_starts = np.zeros(self._window_sizes.shape, dtype=np.int64)
+        self._window_peaks = [np.empty((0,), dtype=np.int64)] * len(self._steps)
+        self._window_troughs = [np.empty((0,), dtype=np.int64)] * len(self._steps)
+
+        # Number of candidates with each vote count, over the whole stream
+        max_votes = (-(-self._window_sizes // self._steps)).sum()
+        self._peak_hist = np.zeros((max_votes + 1,), dtype=np.int64)
+        self._trough_hist = np.zeros((max_votes + 1,), dtype=np.int64)
+
+        # Voted candidates not yet part of a confirmed breath
+        self._peaks = np.empty((0,), dtype=np.int64)
+        self._peak_votes = np.empty((0,), dtype=np.int64)
+        self._troughs = np.empty((0,), dtype=np.int64)
+        self._trough_votes = np.empty((0,), dtype=np.int64)
+
+        # Last confirmed breath, waiting for the next inhale onset
+        self._breath = None
+
+    def push(self, chunk):
+        samples = np.concatenate((self._pending, np.asarray(chunk, dtype=float)))
+        n_pieces = samples.shape[0] // self._piece_size
+
+        breaths = []
+        for piece in range(n_pieces):
+            start = piece * self._piece_size
+            self._push_piece(samples[start : start + self._piece_size])
+            breaths.extend(self._find_breaths())
+
+        self._pending = samples[n_pieces * self._piece_size :].copy()
+        return np.array(breaths, dtype=BREATH_DTYPE)
+
+    def _push_piece(self, raw):
+        n = raw.shape[0]
+        idx = np.arange(self.n_samples, self.n_samples + n)
+
+        # Causal moving mean, normalized by the samples seen at the start
+        y = np.concatenate((self._raw_tail, raw))
+        prefix = np.zeros((y.shape[0] + 1,))
+        np.cumsum(y, out=prefix[1:])
+        upper = np.arange(self._raw_tail.shape[0] + 1, y.shape[0] + 1)
+        lower = np.maximum(upper - self._smooth_size, 0)
+        smoothed = (prefix[upper] - prefix[lower]) / (upper - lower)
+        self._raw_tail = y[max(y.shape[0] - self._smooth_size + 1, 0) :]
+
+        # Trailing mean over the drift period, from a running sum. Pieces are
+        # never longer than the period, so the samples leaving the sum are all
+        # in the history
+        leaving = np.zeros((n,))
+        first_left = max(idx[0], self._drift_size)
+        if first_left <= idx[-1]:
+            leaving[first_left - idx[0] :] = self._smoothed.get(
+                first_left - self._drift_size, idx[-1] + 1 - self._drift_size
+            )
+        window_sum = self._drift_sum + np.cumsum(smoothed - leaving)
+        detrended = smoothed - window_sum / np.minimum(idx + 1, self._drift_size)
+
+        self._smoothed.extend(smoothed)
+        self._drift_sum = window_sum[-1]
+        self._since_resync += n
+        if self._since_resync >= self._drift_size:
+            # Keeps rounding errors from accumulating in the running sum
+            self._drift_sum = self._smoothed.get(
+                idx[-1] + 1 - self._drift_size, idx[-1] + 1
+            ).sum()
+            self._since_resync = 0
+
+        # Running mean and variance, merged with the piece statistics
+        self._count, self._mean, self._m2 = update_moments(
+            self._count, self._mean, self._m2, detrended
+        )
+
+        std = sqrt(self._m2 / self._count)
+        normalized = (detrended - self._mean) / (std if std > 0 else 1)
+
+        self._detrended.extend(detrended)
+        self._normalized.extend(normalized)
+        self.n_samples += n
+
+    def _vote(self):
+        # Windows start at multiples of their step from the start of the stream
+        # and are reduced once they are complete
+        for i, (w_size, step) in enumerate(zip(self._window_sizes, self._steps)):
+            first = self._next_starts[i]
+            if self.n_samples - first < w_size:
+                continue
+
+            w_starts = np.arange(first, self.n_samples - w_size + 1, step)
+            windows = sliding_window_view(
+                self._normalized.get(first, w_starts[-1] + w_size), w_size
+            )[::step]
+
+            self._window_peaks[i] = np.concatenate(
+                (self._window_peaks[i], windows.argmax(axis=1) + w_starts)
+            )
+            self._window_troughs[i] = np.concatenate(
+                (self._window_troughs[i], windows.argmin(axis=1) + w_starts)
+            )
+            self._next_starts[i] = w_starts[-1] + step
+
+        # Candidates before the next window of every size have all their votes
+        bound = self._next_starts.min()
+        final_peaks, final_troughs = [], []
+        for i in range(len(self._steps)):
+            n_final = np.searchsorted(self._window_peaks[i], bound)
+            final_peaks.append(self._window_peaks[i][:n_final])
+            self._window_peaks[i] = self._window_peaks[i][n_final:]
+
+            n_final = np.searchsorted(self._window_troughs[i], bound)
+            final_troughs.append(self._window_troughs[i][:n_final])
+            self._window_troughs[i] = self._window_troughs[i][n_final:]
+
+        peaks, peak_votes, troughs, trough_votes = count_votes(
+            final_peaks, final_troughs
+        )
+        self._peak_hist += np.bincount(peak_votes, minlength=self._peak_hist.size)
+        self._trough_hist += np.bincount(trough_votes, minlength=self._trough_hist.size)
+
+        self._peaks = np.concatenate((self._peaks, peaks))
+        self._peak_votes = np.concatenate((self._peak_votes, peak_votes))
+        self._troughs = np.concatenate((self._troughs, troughs))
+        self._trough_votes = np.concatenate((self._trough_votes, trough_votes))
+
+    def _drop_candidates(self, bound):
+        is_kept = self._peaks >= bound
+        self._peaks = self._peaks[is_kept]
+        self._peak_votes = self._peak_votes[is_kept]
+
+        is_kept = self._troughs >= bound
+        self._troughs = self._troughs[is_kept]
+        self._trough_votes = self._trough_votes[is_kept]
+
+    def _find_breaths(self):
+        self._vote()
+
+        # Candidates older than the history cannot be measured anymore. Neither
+        # can a breath left waiting through a longer flat or disconnected stretch,
+        # which is emitted without its exhale offset and volumes
+        self._drop_candidates(self._normalized.start)
+        breaths = []
+        if self._breath is not None and self._breath[2] < self._detrended.start:
+            breaths.append(self._finalize(self._breath, None, MISSING))
+            self._breath = None
+
+        threshold = floor(
+            np.mean(
+                [
+                    find_hist_threshold(
+                        self._peak_hist, self.window_sizes_ms, self.shift
+                    ),
+                    find_hist_threshold(
+                        self._trough_hist, self.window_sizes_ms, self.shift
+                    ),
+                ]
+            )
+        )
+        peaks = self._peaks[self._peak_votes >= threshold]
+        troughs = self._troughs[self._trough_votes >= threshold]
+        if peaks.size == 0 or troughs.size == 0:
+            return breaths
+
+        base = min(peaks[0], troughs[0])
+        peaks, troughs = find_corrected_extrema(
+            self._normalized.get(base, max(peaks[-1], troughs[-1]) + 1),
+            peaks - base,
+            troughs - base,
+            self.backend,
+        )
+
+        # The last breath may still change as new candidates come in
+        for peak, trough in zip(peaks[:-1] + base, troughs[:-1] + base):
+            breath = self._confirm(peak, trough)
+            if breath is not None:
+                breaths.append(breath)
+
+        if peaks.size > 1:
+            self._drop_candidates(peaks[-1] + base)
+
+        return breaths
+
+    def _confirm(self, peak, trough):
+        # The running z-score centers the signal on zero
+        signal_zero_cross = 0.0
+        exhale_onset, inhale_pause_onset = find_extrema_pause_onset(
+            self._normalized.get(peak, trough),
+            peak,
+            False,
+            *find_bin_params(int(find_n_bins(trough - peak, self.sr))),
+            signal_zero_cross,
+            self.backend,
+        )
+
+        previous = self._breath
+        if previous is None:
+            start = self._normalized.start
+            is_below = self._normalized.get(start, peak) <= signal_zero_cross
+            below = np.flatnonzero(is_below)
+            inhale_onset = start + (below[-1] if below.size > 0 else 0)
+        else:
+            start = max(previous[1], self._normalized.start)
+            inhale_onset, exhale_pause_onset = find_extrema_pause_onset(
+                self._normalized.get(start, peak),
+                start,
+                True,
+                *find_bin_params(int(find_n_bins(peak - start, self.sr))),
+                signal_zero_cross,
+                self.backend,
+            )
+
+        self._breath = (peak, trough, inhale_onset, exhale_onset, inhale_pause_onset)
+        if previous is not None:
+            return self._finalize(previous, inhale_onset, exhale_pause_onset)
+
+    def _finalize(self, breath, next_inhale_onset, exhale_pause_onset):
+        peak, trough, inhale_onset, exhale_onset, inhale_pause_onset = breath
+
+        inhale_offset = (
+            exhale_onset if is_missing(inhale_pause_onset) else inhale_pause_onset
+        ) - 1
+
+        # Without the next inhale onset, the breath has left the history
+        if next_inhale_onset is None:
+            exhale_offset = MISSING
+            inhale_volume = exhale_volume = np.nan
+        else:
+            exhale_offset = (
+                next_inhale_onset
+                if is_missing(exhale_pause_onset)
+                else exhale_pause_onset
+            ) - 1
+            inhale_volume = np.abs(
+                self._detrended.get(inhale_onset, int(inhale_offset) + 1)
+            ).sum()
+            exhale_volume = np.abs(
+                self._detrended.get(exhale_onset, int(exhale_offset) + 1)
+            ).sum()
+
+        return (
+            peak,
+            trough,
+            inhale_onset,
+            exhale_onset,
+            inhale_pause_onset,
+            exhale_pause_onset,
+            inhale_offset,
+            exhale_offset,
+            inhale_volume / self.sr * 1000,
+            exhale_volume / self.sr * 1000,
+            (inhale_offset - inhale_onset) / self.sr,
+            (
+                np.nan
+                if is_missing(exhale_offset)
+                else (exhale_offset - exhale_onset) / self.sr
+            ),
+        )
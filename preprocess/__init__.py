@@ -1,3 +1,33 @@
-from ._preprocess import mean_smooth, remove_global_drift, remove_local_drift, z_score
+from ._preprocess import (
+    SMOOTH_WINDOW,
+    DRIFT_ORDER,
+    mean_smooth,
+    global_drift_normal_equations,
+    solve_global_drift,
+    eval_global_drift,
+    remove_global_drift,
+    remove_local_drift,
+    update_moments,
+    decimation_factor,
+    decimate,
+    to_full_rate,
+    refine_extrema,
+    z_score,
+)
 
-__all__ = ["mean_smooth", "remove_global_drift", "remove_local_drift", "z_score"]
+__all__ = [
+    "SMOOTH_WINDOW",
+    "DRIFT_ORDER",
+    "mean_smooth",
+    "global_drift_normal_equations",
+    "solve_global_drift",
+    "eval_global_drift",
+    "remove_global_drift",
+    "remove_local_drift",
+    "update_moments",
+    "decimation_factor",
+    "decimate",
+    "to_full_rate",
+    "refine_extrema",
+    "z_score",
+]
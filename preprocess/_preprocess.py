@@ -1,66 +1,279 @@
 import numpy as np
 from math import floor
-from sklearn.linear_model import LinearRegression
-from scipy.fft import fft, ifft
-
-
-def mean_smooth(y, sr):
-    window_samples = int(sr / 1000 * 25)  # 25 ms windows
-
-    y_padded = np.hstack(
-        (
-            np.zeros(
-                window_samples - 1,
-            ),
-            y,
-            np.zeros(
-                window_samples,
-            ),
-        )
+from instrumentation import instrument
+
+SMOOTH_WINDOW = 25  # ms
+BLOCK_SIZE = 1 << 16  # samples
+DRIFT_ORDER = 1
+
+
+@instrument("preprocess.mean_smooth")
+def mean_smooth(
+    y, sr, window_ms=SMOOTH_WINDOW, out=None, mode="full", axis=-1, dtype=np.float64
+):
+    window_samples = max(int(sr / 1000 * window_ms), 1)
+    _y = np.moveaxis(y, axis, -1)
+    n_samples = _y.shape[-1]
+
+    # "full" keeps every partially covered window, "same" keeps the len(y)
+    # windows centered on the samples of y
+    if mode == "full":
+        offset, n_out = 0, n_samples + window_samples - 1
+    elif mode == "same":
+        offset, n_out = (window_samples - 1) // 2, n_samples
+    else:
+        raise ValueError(f"Unknown mode {mode!r}, expected 'full' or 'same'")
+
+    out_shape = _y.shape[:-1] + (n_out,)
+    if out is None:
+        out = np.moveaxis(np.empty(out_shape, dtype), -1, axis)
+    _out = np.moveaxis(out, axis, -1)
+    if _out.shape != out_shape:
+        raise ValueError(f"Expected out of shape {out_shape}, got {_out.shape}")
+
+    # Sample i of the full output averages y[i - window_samples + 1 : i + 1],
+    # clipped to the signal boundaries, so the edges are normalized by the valid
+    # sample count.
+    for start in range(0, n_out, BLOCK_SIZE):
+        stop = min(start + BLOCK_SIZE, n_out)
+        _out[..., start:stop] = _boxcar_mean(_y, window_samples, offset, start, stop)
+
+    return out
+
+
+def _boxcar_mean(y, w_size, offset, start, stop, base=0, n_samples=None):
+    # Means of y[i + offset - w_size + 1 : i + offset + 1] for i in [start, stop),
+    # clipped to the n_samples of the signal. y holds the signal from the
+    # absolute index base and only the samples under the windows are read
+    if n_samples is None:
+        n_samples = base + y.shape[-1]
+
+    idx = np.arange(start + offset, stop + offset)
+    lower = np.maximum(idx - w_size + 1, 0)
+    upper = np.minimum(idx + 1, n_samples)
+
+    # Prefix sums are local to the block and in double precision whatever the
+    # output dtype, to keep rounding errors bounded
+    prefix = np.zeros(y.shape[:-1] + (upper[-1] - lower[0] + 1,))
+    np.cumsum(y[..., lower[0] - base : upper[-1] - base], axis=-1, out=prefix[..., 1:])
+
+    return (prefix[..., upper - lower[0]] - prefix[..., lower - lower[0]]) / (
+        upper - lower
     )
 
-    smoothed = np.zeros(
-        y_padded.shape[0] - 5,
+
+def _drift_basis(start, stop, n_samples, order):
+    # Legendre polynomials of the sample index mapped onto [-1, 1], which keeps
+    # the normal equations well conditioned for long signals and higher orders
+    x = np.arange(start, stop) * (2 / max(n_samples - 1, 1)) - 1
+    return np.polynomial.legendre.legvander(x, order)
+
+
+def global_drift_normal_equations(y, start, n_samples, order=DRIFT_ORDER):
+    # Least squares normal equations of the samples of y, which start at the
+    # absolute index start of a signal of n_samples, accumulated block by block
+    gram = np.zeros((order + 1, order + 1))
+    rhs = np.zeros(y.shape[:-1] + (order + 1,))
+    for block in range(0, y.shape[-1], BLOCK_SIZE):
+        stop = min(block + BLOCK_SIZE, y.shape[-1])
+        basis = _drift_basis(start + block, start + stop, n_samples, order)
+        gram += basis.T @ basis
+        rhs += y[..., block:stop] @ basis
+
+    return gram, rhs
+
+
+def solve_global_drift(gram, rhs):
+    return np.linalg.solve(gram, rhs.T).T
+
+
+def eval_global_drift(coefs, start, stop, n_samples, order=DRIFT_ORDER):
+    return coefs @ _drift_basis(start, stop, n_samples, order).T
+
+
+def fit_global_drift(y, order=DRIFT_ORDER, axis=-1):
+    _y = np.moveaxis(y, axis, -1)
+    return solve_global_drift(
+        *global_drift_normal_equations(_y, 0, _y.shape[-1], order)
     )
 
-    for i in range(y_padded.shape[0] - window_samples):
-        if i < window_samples - 1:
-            smoothed[i] = y_padded[i : i + window_samples].sum() / (i + 1)
-        elif i > y_padded.shape[0] - 2 * window_samples:
-            smoothed[i] = y_padded[i : i + window_samples].sum() / (
-                y_padded.shape[0] - window_samples - i
-            )
-        else:
-            smoothed[i] = y_padded[i : i + window_samples].mean()
 
-    return smoothed
+def find_global_drift(y, order=DRIFT_ORDER, axis=-1, out=None, dtype=np.float64):
+    coefs = fit_global_drift(y, order, axis)
+
+    if out is None:
+        out = np.empty(y.shape, dtype)
+    _out = np.moveaxis(out, axis, -1)
+    n_samples = _out.shape[-1]
 
+    for start in range(0, n_samples, BLOCK_SIZE):
+        stop = min(start + BLOCK_SIZE, n_samples)
+        _out[..., start:stop] = eval_global_drift(coefs, start, stop, n_samples, order)
 
-def find_global_drift(y):
-    x = np.arange(0, y.shape[0]).reshape(-1, 1)
-    return LinearRegression().fit(x, y).predict(x)
+    return out
 
 
-def remove_global_drift(y):
-    return y - find_global_drift(y)
+@instrument("preprocess.remove_global_drift")
+def remove_global_drift(y, order=DRIFT_ORDER, axis=-1, out=None, dtype=np.float64):
+    coefs = fit_global_drift(y, order, axis)
 
+    # out may be y itself to detrend in place
+    if out is None:
+        out = np.empty(y.shape, dtype)
+    _y = np.moveaxis(y, axis, -1)
+    _out = np.moveaxis(out, axis, -1)
+    n_samples = _out.shape[-1]
+
+    for start in range(0, n_samples, BLOCK_SIZE):
+        stop = min(start + BLOCK_SIZE, n_samples)
+        np.subtract(
+            _y[..., start:stop],
+            eval_global_drift(coefs, start, stop, n_samples, order),
+            out=_out[..., start:stop],
+        )
+
+    return out
+
+
+def _moving_mean(y, w_size, offset, kernel_fft, n_fft, workers):
+    from scipy.fft import irfft, rfft
+
+    # Linear convolution with a boxcar, normalized by the number of samples the
+    # window covers so the edges are not pulled towards zero
+    n_samples = y.shape[0]
+
+    window_sum = irfft(
+        rfft(y, n_fft, workers=workers) * kernel_fft, n_fft, workers=workers
+    )
 
-def find_local_drift(y, sr, period):
-    w_size = floor(sr * period)
+    idx = np.arange(offset, offset + n_samples)
+    counts = np.minimum(idx, n_samples - 1) - np.maximum(idx - w_size + 1, 0) + 1
 
-    # Build filter
-    window = np.zeros((y.shape[0],))
-    window[floor((y.shape[0] - w_size + 1) / 2) : floor((y.shape[0] + w_size) / 2)] = 1
+    return window_sum[offset : offset + n_samples] / counts.astype(window_sum.dtype)
 
-    tmp = ifft(np.multiply(fft(y), fft(window)) / w_size)
-    local_drift = -1 * ifft(np.multiply(fft(-1 * tmp), fft(window)) / w_size)
+
+def _local_drift_blocks(y, w_size, out):
+    n_samples = y.shape[0]
+    block_size = max(BLOCK_SIZE, w_size)
+
+    # Each block of the second pass only needs the first pass around it
+    for start in range(0, n_samples, block_size):
+        stop = min(start + block_size, n_samples)
+        lower = max(start + w_size // 2 - w_size + 1, 0)
+        upper = min(stop + w_size // 2, n_samples)
+
+        first_pass = _boxcar_mean(y, w_size, (w_size - 1) // 2, lower, upper)
+        out[start:stop] = _boxcar_mean(
+            first_pass, w_size, w_size // 2, start, stop, lower, n_samples
+        )
+
+    return out
+
+
+@instrument("preprocess.find_local_drift")
+def find_local_drift(y, sr, period, workers=None, out=None, dtype=np.float64):
+    w_size = max(floor(sr * period), 1)
+
+    # Memory-mapped signals and outputs are processed block by block instead
+    if out is not None or isinstance(y, np.memmap):
+        if out is None:
+            out = np.empty(y.shape, dtype)
+        return _local_drift_blocks(y, w_size, out)
+
+    # scipy is only imported on the FFT path
+    from scipy.fft import next_fast_len, rfft
+
+    # Single precision signals are transformed in single precision (complex64)
+    y = np.asarray(y, dtype)
+
+    # Padding past len(y) + w_size - 1 keeps the end of the signal from wrapping
+    # around into its start
+    n_fft = next_fast_len(y.shape[0] + w_size - 1, real=True)
+    kernel_fft = rfft(np.ones((w_size,), dtype), n_fft, workers=workers)
+
+    # Even windows cannot be centered, so the two passes lean in opposite
+    # directions and cancel out
+    local_drift = _moving_mean(y, w_size, (w_size - 1) // 2, kernel_fft, n_fft, workers)
+    return _moving_mean(local_drift, w_size, w_size // 2, kernel_fft, n_fft, workers)
+
+
+@instrument("preprocess.remove_local_drift")
+def remove_local_drift(y, sr, period=60, workers=None, out=None, dtype=np.float64):
+    if out is None and not isinstance(y, np.memmap):
+        return (y - find_local_drift(y, sr, period, workers, dtype=dtype)).astype(
+            dtype, copy=False
+        )
+
+    local_drift = find_local_drift(y, sr, period, workers, out, dtype)
+    for start in range(0, y.shape[0], BLOCK_SIZE):
+        stop = min(start + BLOCK_SIZE, y.shape[0])
+        np.subtract(y[start:stop], local_drift[start:stop], out=local_drift[start:stop])
 
     return local_drift
 
 
-def remove_local_drift(y, sr, period=60):
-    return y - find_local_drift(y, sr, period)
+def update_moments(count, mean, m2, values):
+    # Merges the count, mean and sum of squared deviations of values into the
+    # running ones (Chan et al.)
+    n = values.shape[0]
+    values_mean = values.mean(dtype=np.float64)
+    delta = values_mean - mean
+
+    total = count + n
+    mean = mean + delta * n / total
+    m2 = (
+        m2
+        + ((values - values_mean) ** 2).sum(dtype=np.float64)
+        + delta**2 * count * n / total
+    )
+
+    return total, mean, m2
+
+
+def decimation_factor(sr, target_sr):
+    # Largest integer factor that keeps the rate at or above target_sr
+    if target_sr is None:
+        return 1
+    return max(floor(sr / target_sr), 1)
+
+
+@instrument("preprocess.decimate")
+def decimate(y, factor, axis=-1, dtype=np.float64):
+    # Keeps every factor-th sample after a zero-phase polyphase low-pass filter
+    # (Kaiser windowed FIR) at the new Nyquist frequency, so sample i of the
+    # output lines up with sample i * factor of y
+    if factor == 1:
+        return np.asarray(y, dtype)
+
+    # scipy is only imported when decimating
+    from scipy.signal import resample_poly
+
+    # Padding with the line fitted at each end keeps drifting signals from being
+    # pulled towards zero at the edges
+    return resample_poly(y, 1, factor, axis=axis, padtype="line").astype(
+        dtype, copy=False
+    )
+
+
+def to_full_rate(idx, factor, n_samples):
+    # Indices of a signal decimated by factor as samples of the n_samples of the
+    # original one. Negative indices mark missing samples and are kept
+    idx = np.asarray(idx, dtype=np.int64)
+    return np.where(idx < 0, idx, np.minimum(idx * factor, n_samples - 1))
+
+
+def refine_extrema(y, idx, radius, find_max=True):
+    # Moves each index to the largest (or smallest) sample of y within radius
+    idx = np.asarray(idx, dtype=np.int64)
+    w_size = min(2 * radius + 1, y.shape[0])
+    if idx.size == 0 or w_size < 2:
+        return idx
+
+    starts = np.clip(idx - radius, 0, y.shape[0] - w_size)
+    windows = np.lib.stride_tricks.sliding_window_view(y, w_size)[starts]
+    return starts + (windows.argmax(axis=1) if find_max else windows.argmin(axis=1))
 
 
-def z_score(y):
-    return (y - y.mean()) / y.std()
+@instrument("preprocess.z_score")
+def z_score(y, axis=None):
+    return (y - y.mean(axis, keepdims=True)) / y.std(axis, keepdims=True)
@@ -0,0 +1,3 @@
+from ._signal_io import load_signal, scratch_array
+
+__all__ = ["load_signal", "scratch_array"]
@@ -0,0 +1,37 @@
+import os
+import tempfile
+import numpy as np
+
+
+def load_signal(path, dtype=None, offset=0, mode="r"):
+    # .npy files keep their header, .csv files hold one sample per line in their
+    # first column and other files are read as raw samples of dtype from the
+    # byte offset. Samples are only read from disk when sliced, except for .csv
+    # files which are parsed at once
+    path = os.fspath(path)
+    if path.endswith(".npy"):
+        return np.load(path, mmap_mode=mode)
+    if path.endswith(".csv"):
+        return np.loadtxt(
+            path,
+            dtype=float if dtype is None else dtype,
+            delimiter=",",
+            usecols=0,
+            ndmin=1,
+        )
+
+    if dtype is None:
+        raise ValueError(f"Expected the dtype of the raw samples in {path}")
+    return np.memmap(path, dtype=dtype, mode=mode, offset=offset)
+
+
+def scratch_array(shape, dtype=float, path=None):
+    # Memory-mapped .npy file at path, or an anonymous temporary file removed
+    # once the array is garbage collected
+    if path is not None:
+        return np.lib.format.open_memmap(
+            os.fspath(path), mode="w+", dtype=dtype, shape=shape
+        )
+
+    with tempfile.TemporaryFile() as file:
+        return np.memmap(file, dtype=dtype, mode="w+", shape=shape)
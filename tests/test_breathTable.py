@@ -0,0 +1,53 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from numpy.testing import assert_array_equal
+from metrics import BREATH_DTYPE, BreathTable
+from pipeline import BreathMetrics
+from .test_findOnsetOffset import breathing_signal
+
+
+class TestBreathTable(unittest.TestCase):
+    def setUp(self):
+        self.table = BreathMetrics(breathing_signal(60, 100, 0), 100).breaths
+
+    def test__columns_are_views(self):
+        self.assertIsInstance(self.table, BreathTable)
+        self.assertEqual(self.table.columns, BREATH_DTYPE.names)
+        self.assertTrue(np.shares_memory(self.table["peaks"], self.table.data))
+
+        rows = self.table[2:5]
+        self.assertEqual(len(rows), 3)
+        self.assertTrue(np.shares_memory(rows.data, self.table.data))
+        self.assertEqual(len(self.table[0]), 1)
+
+    def test__between(self):
+        onsets = self.table["inhale_onsets"]
+
+        rows = self.table.between(10, 20)
+        assert_array_equal(
+            rows["inhale_onsets"], onsets[(onsets >= 1000) & (onsets < 2000)]
+        )
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(len(self.table.between(1000, 2000)), 0)
+
+    def test__save_load(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "breaths.npz")
+            self.table.save(path)
+            loaded = BreathTable.load(path)
+
+        self.assertEqual(loaded.sr, 100)
+        for name in self.table.columns:
+            assert_array_equal(loaded[name], self.table[name])
+
+    def test__from_columns(self):
+        with self.assertRaises(ValueError):
+            BreathTable.from_columns(100, peaks=[1, 2])
+        with self.assertRaises(ValueError):
+            BreathTable(np.zeros((2,)), 100)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+from numpy.testing import assert_array_equal
+from pipeline import BreathMetrics, DiskCache
+from preprocess import remove_global_drift
+from extrema_detection import find_potential_extrema
+from .test_findOnsetOffset import breathing_signal
+
+
+class TestDiskCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache = DiskCache(self.tmp_dir.name)
+        self.y = breathing_signal(30, 100, 0)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test__reuses_stages(self):
+        expected = BreathMetrics(self.y, 100, cache=self.cache).breaths
+
+        with mock.patch(
+            "pipeline._pipeline.find_potential_extrema", wraps=find_potential_extrema
+        ) as potential_extrema:
+            bm = BreathMetrics(self.y.copy(), 100, cache=self.cache)
+            for name in expected.columns:
+                assert_array_equal(bm.breaths[name], expected[name])
+            potential_extrema.assert_not_called()
+
+            # Another signal is not a hit
+            BreathMetrics(self.y[:-1], 100, cache=self.cache).breaths
+            potential_extrema.assert_called_once()
+
+    def test__recomputes_downstream_of_changed_params(self):
+        BreathMetrics(self.y, 100, cache=self.cache).breaths
+
+        with mock.patch(
+            "pipeline._pipeline.remove_global_drift", wraps=remove_global_drift
+        ) as global_drift, mock.patch(
+            "pipeline._pipeline.find_potential_extrema", wraps=find_potential_extrema
+        ) as potential_extrema:
+            bm = BreathMetrics(self.y, 100, cache=self.cache, shift=2)
+            bm.breaths
+
+            global_drift.assert_not_called()
+            potential_extrema.assert_called_once()
+            self.assertEqual(
+                len(bm.extrema[0]), len(BreathMetrics(self.y, 100, shift=2).extrema[0])
+            )
+
+    def test__evicts_least_recently_used(self):
+        cache = DiskCache(self.tmp_dir.name, max_bytes=3000)
+        # Distinct last uses in the past, whatever the mtime resolution
+        for i in range(3):
+            cache.put(f"key{i}", [np.zeros((100,))])
+            last_use = 1_000_000_000 + i
+            os.utime(os.path.join(self.tmp_dir.name, f"key{i}"), (last_use, last_use))
+
+        # Reading key0 makes key1 the least recently used
+        cache.get("key0")
+        cache.put("key3", [np.zeros((100,))])
+
+        keys = sorted(key for _, _, key in cache.entries())
+        self.assertEqual(keys, ["key0", "key2", "key3"])
+        self.assertLessEqual(sum(size for _, size, _ in cache.entries()), 3000)
+        self.assertIsNone(cache.get("key1"))
+
+        arrays = cache.get("key3")
+        assert_array_equal(arrays[0], np.zeros((100,)))
+
+        cache.clear()
+        self.assertEqual(os.listdir(self.tmp_dir.name), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,42 @@
+import unittest
+import numpy as np
+from numpy.testing import assert_allclose, assert_array_equal
+from pipeline import BreathMetrics, process_chunked
+from .test_findOnsetOffset import breathing_signal
+
+
+class TestProcessChunked(unittest.TestCase):
+    def test__matches_single_shot(self):
+        for seed, sr in [(0, 100), (1, 250)]:
+            y = breathing_signal(100, sr, seed)
+            y += np.linspace(0, 3, y.shape[0])
+            bm = BreathMetrics(y, sr)
+
+            # Seams fall inside breaths, and every chunk is shorter than the
+            # largest extrema window for the smallest size
+            for chunk_size in [sr * 3, sr * 20 + 7, y.shape[0]]:
+                breaths, metrics = process_chunked(y, sr, chunk_size)
+
+                self.assertGreater(breaths["peaks"].shape[0], 90)
+                for field, expected in bm.breaths.to_dict().items():
+                    if expected.dtype.kind == "i":
+                        assert_array_equal(breaths[field], expected)
+                    else:
+                        # Volumes are differences of cumulative sums
+                        assert_allclose(breaths[field], expected, rtol=1e-9, atol=1e-6)
+                for field, expected in bm.metrics.items():
+                    assert_allclose(metrics[field], expected, rtol=1e-9)
+
+    def test__without_preprocessing(self):
+        y = breathing_signal(30, 100, 2)
+        bm = BreathMetrics(y, 100, smooth_window_ms=None, drift_order=None)
+        breaths, _ = process_chunked(
+            y, 100, 1000, smooth_window_ms=None, drift_order=None
+        )
+
+        assert_array_equal(breaths["inhale_onsets"], bm.breaths["inhale_onsets"])
+        assert_allclose(breaths["exhale_volumes"], bm.breaths["exhale_volumes"])
+
+
+if __name__ == "__main__":
+    unittest.main()
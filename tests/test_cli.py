@@ -0,0 +1,139 @@
+import csv
+import os
+import tempfile
+import unittest
+import numpy as np
+from numpy.testing import assert_allclose, assert_array_equal
+from breathmetrics import OUTPUT_FIELDS, find_recordings, main, run_batch
+from metrics import BreathTable
+from pipeline import BreathMetrics
+from .test_findOnsetOffset import breathing_signal
+
+
+class TestRunBatch(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.signals = [breathing_signal(20 + i, 100, i) for i in range(3)]
+
+        np.save(self.path("a.npy"), self.signals[0])
+        np.savetxt(self.path("b.csv"), self.signals[1], delimiter=",")
+        self.signals[2].astype(np.float32).tofile(self.path("c.raw"))
+        with open(self.path("notes.txt"), "w") as file:
+            file.write("not a recording")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.tmp_dir.name, name)
+
+    def read_csv(self, path):
+        with open(path, newline="", encoding="utf-8") as file:
+            return list(csv.DictReader(file))
+
+    def test__find_recordings(self):
+        names = ["a.npy", "b.csv", "c.raw"]
+        self.assertEqual(
+            find_recordings(self.tmp_dir.name), [self.path(n) for n in names]
+        )
+        self.assertEqual(find_recordings(self.path("*.npy")), [self.path("a.npy")])
+
+    def test__csv_output(self):
+        output = self.path("metrics.csv")
+        breaths_dir = self.path("breaths")
+
+        with self.assertLogs("breathmetrics", "INFO") as logs:
+            self.assertEqual(
+                main(
+                    [
+                        self.tmp_dir.name,
+                        "-o",
+                        output,
+                        "--sr",
+                        "100",
+                        "-j",
+                        "2",
+                        "--raw-dtype",
+                        "float32",
+                        "--breaths-dir",
+                        breaths_dir,
+                        "-q",
+                    ]
+                ),
+                0,
+            )
+        self.assertIn("files/s", "\n".join(logs.output))
+
+        rows = self.read_csv(output)
+        self.assertEqual(tuple(rows[0]), OUTPUT_FIELDS)
+        self.assertEqual(
+            [row["recording"] for row in rows],
+            [self.path(name) for name in ["a.npy", "b.csv", "c.raw"]],
+        )
+
+        for row, signal in zip(rows, self.signals):
+            bm = BreathMetrics(signal, 100)
+            self.assertEqual(int(row["n_breaths"]), len(bm.breaths))
+            for name, value in bm.metrics.items():
+                assert_allclose(float(row[name]), value, rtol=1e-6)
+
+        breaths = BreathTable.load(os.path.join(breaths_dir, "a.npy.npz"))
+        assert_array_equal(
+            breaths["peaks"], BreathMetrics(self.signals[0], 100).extrema[0]
+        )
+
+    def test__resumes(self):
+        output = self.path("metrics.csv")
+
+        # Raw recordings fail without their dtype and are retried next time
+        with self.assertLogs("breathmetrics", "WARNING") as logs:
+            self.assertEqual(run_batch(self.tmp_dir.name, output, 100, 1), (2, 0, 1))
+        self.assertIn("c.raw", logs.output[0])
+        self.assertEqual(
+            run_batch(self.tmp_dir.name, output, 100, 1, raw_dtype=np.float32),
+            (1, 2, 0),
+        )
+        self.assertEqual(len(self.read_csv(output)), 3)
+
+    def test__resumes_after_truncation(self):
+        output = self.path("metrics.csv")
+        run_batch(self.tmp_dir.name, output, 100, 1, raw_dtype=np.float32)
+        rows = self.read_csv(output)
+
+        # A write interrupted in the middle of the last number
+        with open(output, "rb+") as file:
+            file.truncate(os.path.getsize(output) - 8)
+
+        self.assertEqual(
+            run_batch(self.tmp_dir.name, output, 100, 1, raw_dtype=np.float32),
+            (1, 2, 0),
+        )
+        self.assertEqual(self.read_csv(output), rows)
+        self.assertEqual(
+            run_batch(self.tmp_dir.name, output, 100, 1, raw_dtype=np.float32),
+            (0, 3, 0),
+        )
+
+    def test__npz_output(self):
+        output = self.path("metrics.npz")
+
+        run_batch(self.path("*.npy"), output, 100, 1)
+        run_batch(self.path("*.csv"), output, 100, 1)
+        self.assertEqual(run_batch(self.path("*.csv"), output, 100, 1), (0, 1, 0))
+
+        with np.load(output) as file:
+            self.assertEqual(set(file.files), set(OUTPUT_FIELDS))
+            assert_array_equal(
+                file["recording"], [self.path("a.npy"), self.path("b.csv")]
+            )
+            assert_allclose(
+                file["breathing_rate"][0],
+                BreathMetrics(self.signals[0], 100).metrics["breathing_rate"],
+            )
+
+        with self.assertRaises(ValueError):
+            run_batch(self.tmp_dir.name, self.path("metrics.txt"), 100, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
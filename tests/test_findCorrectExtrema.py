@@ -1,6 +1,7 @@
 import unittest
 import numpy as np
 from numpy.testing import assert_array_equal
+from backend import HAS_NUMBA, get_backend, set_backend
 from extrema_detection import find_corrected_extrema
 
 
@@ -173,5 +174,41 @@ class TestFindCorrectExtrema(unittest.TestCase):
         )
 
 
+class TestBackends(unittest.TestCase):
+    def test__set_backend(self):
+        backend = get_backend()
+        try:
+            set_backend("python")
+            self.assertEqual(get_backend(), "python")
+            with self.assertRaises(ValueError):
+                set_backend("cython")
+        finally:
+            set_backend(backend)
+
+    def test__returns_int_arrays(self):
+        y = np.array([1, 0.9, 0, 0.1, 0.9, 1, 0.1, 0])
+        corrected_p, corrected_t = find_corrected_extrema(
+            y, [0, 1, 4, 5], [2, 6], backend="python"
+        )
+
+        self.assertEqual(corrected_p.dtype, np.int64)
+        self.assertEqual(corrected_t.dtype, np.int64)
+
+    @unittest.skipUnless(HAS_NUMBA, "numba is not installed")
+    def test__numba_matches_python(self):
+        rng = np.random.default_rng(0)
+
+        for _ in range(50):
+            y = rng.normal(size=500)
+            peaks = np.sort(rng.choice(500, 60, replace=False))
+            troughs = np.sort(rng.choice(500, 60, replace=False))
+
+            expected = find_corrected_extrema(y, peaks, troughs, backend="python")
+            actual = find_corrected_extrema(y, peaks, troughs, backend="numba")
+
+            assert_array_equal(actual[0], expected[0])
+            assert_array_equal(actual[1], expected[1])
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,125 @@
+import unittest
+from math import floor
+import numpy as np
+from numpy.testing import assert_array_equal
+from extrema_detection import find_potential_extrema, pwct
+from extrema_detection._findExtrema import find_threshold
+
+
+def loop_potential_extrema(y, sr, window_sizes_ms, shift):
+    troughs = []
+    peaks = []
+
+    window_sizes = np.floor(sr / 1000 * np.array(window_sizes_ms)).astype(int)
+
+    for w_size in window_sizes:
+        troughs.append([])
+        peaks.append([])
+
+        w_start = 0
+        while w_start < y.size:
+            window = y[w_start : min(w_start + w_size, len(y))]
+
+            troughs[-1].append(np.argmin(window) + w_start)
+            peaks[-1].append(np.argmax(window) + w_start)
+
+            w_start += int(w_size / shift)
+    return peaks, troughs
+
+
+def loop_find_threshold(votes, n_window_sizes, shift):
+    n_extrema = [(votes > t).sum() for t in range(1, n_window_sizes * shift)]
+    diff_n_extrema = [n_extrema[n] - n_extrema[n - 1] for n in range(1, len(n_extrema))]
+    return [i for i, j in enumerate(diff_n_extrema) if j == max(diff_n_extrema)][-1]
+
+
+def unique_pwct(peaks, troughs, n_window_sizes, shift):
+    peak_idx, peak_votes = np.unique(np.hstack(peaks), return_counts=True)
+    trough_idx, trough_votes = np.unique(np.hstack(troughs), return_counts=True)
+
+    threshold = floor(
+        np.mean(
+            [
+                loop_find_threshold(peak_votes, n_window_sizes, shift),
+                loop_find_threshold(trough_votes, n_window_sizes, shift),
+            ]
+        )
+    )
+    return peak_idx[peak_votes >= threshold], trough_idx[trough_votes >= threshold]
+
+
+class TestFindPotentialExtrema(unittest.TestCase):
+    def assert_same_extrema(self, actual, expected):
+        for actual_idx, expected_idx in zip(
+            actual[0] + actual[1], expected[0] + expected[1]
+        ):
+            assert_array_equal(actual_idx, expected_idx)
+
+    def test__matches_loop_implementation(self):
+        rng = np.random.default_rng(0)
+        y = np.sin(np.linspace(0, 40 * np.pi, 20_000)) + rng.normal(0, 0.3, 20_000)
+
+        for sr, window_sizes_ms, shift in [
+            (200, [300, 500, 700, 1000, 5000], 3),
+            (1000, [300, 500, 700, 1000, 5000], 3),
+            (100, [250, 1200], 4),
+        ]:
+            self.assert_same_extrema(
+                find_potential_extrema(y, sr, window_sizes_ms, shift),
+                loop_potential_extrema(y, sr, window_sizes_ms, shift),
+            )
+
+    def test__ties_and_short_signals(self):
+        y = np.array([0, 1, 1, 0, 0, 1, 1, 0, 2, 2, 0], dtype=float)
+
+        for window_sizes_ms in [[20, 30], [100]]:
+            self.assert_same_extrema(
+                find_potential_extrema(y, 200, window_sizes_ms),
+                loop_potential_extrema(y, 200, window_sizes_ms, 3),
+            )
+
+    def test__offset_and_stop(self):
+        rng = np.random.default_rng(3)
+        y = rng.normal(0, 1, 5000)
+        expected = find_potential_extrema(y, 200)
+
+        # Windows starting in each piece, read with the samples they cover
+        pieces = [
+            find_potential_extrema(y[start:], 200, offset=start, stop=start + 700)
+            for start in range(0, 5000, 700)
+        ]
+        self.assert_same_extrema(
+            (
+                [np.concatenate(w) for w in zip(*[p[0] for p in pieces])],
+                [np.concatenate(w) for w in zip(*[p[1] for p in pieces])],
+            ),
+            expected,
+        )
+
+
+class TestPwct(unittest.TestCase):
+    def test__find_threshold(self):
+        rng = np.random.default_rng(1)
+
+        for _ in range(20):
+            votes = rng.integers(1, 18, rng.integers(1, 500))
+            self.assertEqual(
+                find_threshold(votes, [300, 500, 700, 1000, 5000], 3),
+                loop_find_threshold(votes, 5, 3),
+            )
+
+    def test__matches_unique_voting(self):
+        rng = np.random.default_rng(2)
+        y = np.sin(np.linspace(0, 60 * np.pi, 30_000)) + rng.normal(0, 0.5, 30_000)
+
+        for shift in [2, 3]:
+            peaks, troughs = find_potential_extrema(y, 500, shift=shift)
+            expected = unique_pwct(peaks, troughs, 5, shift)
+            actual = pwct(peaks, troughs, shift=shift)
+
+            assert_array_equal(actual[0], expected[0])
+            assert_array_equal(actual[1], expected[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
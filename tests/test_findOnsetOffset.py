@@ -0,0 +1,179 @@
+import unittest
+import numpy as np
+from numpy.testing import assert_array_equal
+from preprocess import mean_smooth, remove_global_drift, z_score
+from extrema_detection import find_potential_extrema, pwct, find_corrected_extrema
+from onset_offset_detection import MISSING, find_n_bins, find_onsets, find_offsets
+from onset_offset_detection._findOnsetOffset import (
+    hist,
+    find_extrema_pause_onset,
+    find_extrema_pause_onsets,
+)
+
+
+def breathing_signal(n_breaths, sr, seed, noise=0.01):
+    rng = np.random.default_rng(seed)
+
+    breaths = []
+    for _ in range(n_breaths):
+        breath = np.sin(np.linspace(0, 2 * np.pi, int(rng.uniform(3, 5) * sr), False))
+        breaths.append(breath * rng.uniform(0.8, 1.2))
+
+        # Flat stretches after some breaths are detected as pauses
+        if rng.random() < 0.3:
+            breaths.append(np.zeros((int(rng.uniform(0.5, 1.5) * sr),)))
+
+    y = np.hstack(breaths)
+    return y + rng.normal(0, noise, y.shape[0])
+
+
+class TestHist(unittest.TestCase):
+    def test__matches_np_histogram(self):
+        rng = np.random.default_rng(4)
+        windows = [
+            rng.normal(0, 1, 500),
+            # Samples exactly on bin edges
+            np.round(rng.normal(0, 1, 500) * 10) / 10,
+            np.linspace(-1, 1, 199),
+            np.full(20, 0.5),
+        ]
+
+        for window in windows:
+            for n_bins in [25, 50, 100]:
+                bin_edges = np.linspace(window.min(), window.max(), n_bins)
+                expected = np.histogram(window, bin_edges)[0]
+
+                pts_per_bin, actual_edges, mode_bin = hist(window, n_bins)
+                assert_array_equal(pts_per_bin, expected)
+                assert_array_equal(actual_edges, bin_edges)
+                self.assertEqual(mode_bin, np.argmax(expected))
+
+
+class TestFindOnsets(unittest.TestCase):
+    def test__n_bins(self):
+        assert_array_equal(
+            find_n_bins([10, 50, 99, 100, 199, 200, 5000]),
+            [25, 25, 25, 50, 50, 100, 100],
+        )
+        assert_array_equal(find_n_bins([100, 5000], 100), [50, 50])
+        assert_array_equal(find_n_bins([100, 5000], 250), [50, 100])
+
+    def test__low_sample_rate(self):
+        # Noisy breaths without pauses, a few samples per bin at 25 Hz
+        rng = np.random.default_rng(5)
+        sr = 25
+        y = np.hstack(
+            [
+                np.sin(np.linspace(0, 2 * np.pi, int(rng.uniform(3, 5) * sr), False))
+                for _ in range(60)
+            ]
+        )
+        y += rng.normal(0, 0.05, y.shape)
+        peaks, troughs = find_corrected_extrema(
+            y, *pwct(*find_potential_extrema(y, sr))
+        )
+
+        def n_pauses(onsets):
+            return np.count_nonzero(onsets[2] != MISSING) + np.count_nonzero(
+                onsets[3] != MISSING
+            )
+
+        fixed = find_onsets(y, peaks, troughs, sr=sr, n_bins=100)
+        adaptive = find_onsets(y, peaks, troughs, sr=sr)
+        self.assertGreater(n_pauses(fixed), 0)
+        self.assertEqual(n_pauses(adaptive), 0)
+
+        expected = find_onsets(y, peaks, troughs, sr=sr, batched=False)
+        for actual_onsets, expected_onsets in zip(adaptive, expected):
+            assert_array_equal(actual_onsets, expected_onsets)
+
+    def test__batched_matches_per_breath(self):
+        for seed, sr, noise in [(0, 200, 0.01), (1, 500, 0.001), (2, 1000, 0.02)]:
+            y = breathing_signal(40, sr, seed, noise)
+
+            # Quantized signals put many samples exactly on bin edges
+            if seed == 1:
+                y = np.round(y * 20) / 20
+
+            peaks, troughs = find_corrected_extrema(
+                y, *pwct(*find_potential_extrema(y, sr))
+            )
+            expected = find_onsets(y, peaks, troughs, batched=False)
+            actual = find_onsets(y, peaks, troughs)
+
+            self.assertTrue((expected[3] != MISSING).any(), "Should find pauses")
+            for actual_onsets, expected_onsets in zip(actual, expected):
+                assert_array_equal(actual_onsets, expected_onsets)
+
+    def test__batched_matches_per_breath_float32(self):
+        # Thousands of quantized single precision windows, whose bin edges are
+        # only matched when computed in float32 like np.linspace does
+        y = np.round(breathing_signal(3000, 100, 0) * 20) / 20
+        y = mean_smooth(y, 100, mode="same", dtype=np.float32)
+        y = z_score(remove_global_drift(y, dtype=np.float32))
+        peaks, troughs = find_corrected_extrema(
+            y, *pwct(*find_potential_extrema(y, 100))
+        )
+
+        expected = find_onsets(y, peaks, troughs, sr=100, batched=False)
+        actual = find_onsets(y, peaks, troughs, sr=100)
+        for actual_onsets, expected_onsets in zip(actual, expected):
+            assert_array_equal(actual_onsets, expected_onsets)
+
+    def test__find_extrema_pause_onsets(self):
+        rng = np.random.default_rng(3)
+        y = breathing_signal(20, 200, 3)
+        w_starts = np.sort(rng.choice(y.shape[0] - 1000, 50, replace=False))
+        w_stops = w_starts + rng.integers(1, 1000, 50)
+
+        # Includes a flat window
+        y[w_starts[0] : w_stops[0]] = 0.5
+
+        for is_inhale in [True, False]:
+            args = (is_inhale, 100, 70, 30, 5, 5, y.mean())
+            extrema_onsets, pause_onsets = find_extrema_pause_onsets(
+                y, w_starts, w_stops, *args
+            )
+
+            for window, (start, stop) in enumerate(zip(w_starts, w_stops)):
+                extrema_onset, pause_onset = find_extrema_pause_onset(
+                    y[start:stop], start, *args
+                )
+                self.assertEqual(extrema_onsets[window], extrema_onset)
+                assert_array_equal(pause_onsets[window], pause_onset)
+
+
+class TestFindOffsets(unittest.TestCase):
+    def test__pauses_and_last_exhale(self):
+        y = np.hstack([np.full(50, -1.0), np.full(20, 1.0)])
+        inhale_onsets = np.array([0, 20, 40])
+        exhale_onsets = np.array([10, 30, 45])
+        inhale_pause_onsets = np.array([8, MISSING, MISSING])
+        exhale_pause_onsets = np.array([MISSING, 35, MISSING])
+
+        inhale_offsets, exhale_offsets = find_offsets(
+            y, inhale_onsets, exhale_onsets, inhale_pause_onsets, exhale_pause_onsets
+        )
+
+        assert_array_equal(inhale_offsets, [7, 29, 44])
+        assert_array_equal(exhale_offsets, [19, 34, 49])
+
+        _, exhale_offsets = find_offsets(
+            -y, inhale_onsets, exhale_onsets, inhale_pause_onsets, exhale_pause_onsets
+        )
+        assert_array_equal(exhale_offsets, [19, 34, MISSING])
+        self.assertEqual(exhale_offsets.dtype, np.int64)
+
+        # Pauses stored as floats are missing where NaN
+        _, exhale_offsets = find_offsets(
+            -y,
+            inhale_onsets,
+            exhale_onsets,
+            np.where(inhale_pause_onsets == MISSING, np.nan, inhale_pause_onsets),
+            np.where(exhale_pause_onsets == MISSING, np.nan, exhale_pause_onsets),
+        )
+        assert_array_equal(exhale_offsets, [19, 34, MISSING])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ("sklearn", "scipy", "numba", "matplotlib")
+
+CODE = """
+import json, sys, time
+
+start = time.perf_counter()
+import breathmetrics
+import_time = time.perf_counter() - start
+after_import = sorted(sys.modules)
+
+start = time.perf_counter()
+breathmetrics.BreathMetrics
+pipeline_time = time.perf_counter() - start
+
+print(json.dumps({
+    "import_time": import_time,
+    "after_import": after_import,
+    "pipeline_time": pipeline_time,
+    "after_pipeline": sorted(sys.modules),
+}))
+"""
+
+
+def loaded(modules, name):
+    return any(module == name or module.startswith(name + ".") for module in modules)
+
+
+def probe_imports():
+    # Modules loaded and seconds spent by import breathmetrics and by the
+    # pipeline behind it, in a fresh interpreter since this one may already have
+    # imported everything. The timings are checked by benchmarks/bench_imports.py
+    result = subprocess.run(
+        [sys.executable, "-c", CODE],
+        cwd=ROOT,
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    return json.loads(result.stdout)
+
+
+class TestImports(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.result = probe_imports()
+
+    def test__import_is_lazy(self):
+        modules = self.result["after_import"]
+        for name in HEAVY_MODULES + ("numpy", "pipeline", "preprocess"):
+            self.assertFalse(loaded(modules, name), name)
+
+    def test__pipeline_loads_without_heavy_dependencies(self):
+        modules = self.result["after_pipeline"]
+        self.assertTrue(loaded(modules, "pipeline"))
+        for name in HEAVY_MODULES:
+            self.assertFalse(loaded(modules, name), name)
+
+    def test__facade(self):
+        import breathmetrics
+        from pipeline import BreathMetrics
+
+        self.assertIs(breathmetrics.BreathMetrics, BreathMetrics)
+        self.assertIn("preprocess", dir(breathmetrics))
+        self.assertTrue(hasattr(breathmetrics.preprocess, "mean_smooth"))
+        with self.assertRaises(AttributeError):
+            breathmetrics.missing
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+import threading
+import tracemalloc
+import unittest
+import numpy as np
+from numpy.testing import assert_array_equal
+from instrumentation import StageRecord, collect, current_collector, instrument
+from pipeline import BreathMetrics
+from preprocess import mean_smooth
+from .test_findOnsetOffset import breathing_signal
+
+
+@instrument("tests.allocate")
+def allocate(n_bytes, inner=0):
+    buffer = np.ones((n_bytes // 8,))
+    if inner:
+        allocate(inner)
+    return buffer.sum()
+
+
+class TestInstrumentation(unittest.TestCase):
+    def setUp(self):
+        self.y = breathing_signal(20, 100, 0)
+
+    def test__collects_pipeline_stages(self):
+        records = []
+        with collect(records.append) as collector:
+            breaths = BreathMetrics(self.y, 100).breaths
+
+        for stage in [
+            "preprocess.mean_smooth",
+            "preprocess.remove_global_drift",
+            "extrema_detection.find_potential_extrema",
+            "extrema_detection.pwct",
+            "onset_offset_detection.find_onsets",
+            "onset_offset_detection.find_offsets",
+            "metrics.find_volumes",
+        ]:
+            self.assertEqual(collector.stats[stage]["calls"], 1, stage)
+            self.assertGreater(collector.stats[stage]["wall_time"], 0)
+
+        self.assertEqual(
+            collector.stats["preprocess.mean_smooth"]["n_samples"], self.y.size
+        )
+        self.assertTrue(all(isinstance(record, StageRecord) for record in records))
+        self.assertEqual(
+            len(records), sum(s["calls"] for s in collector.stats.values())
+        )
+        self.assertIn("preprocess.mean_smooth", collector.summary())
+
+        # Results do not depend on the instrumentation
+        assert_array_equal(
+            breaths["peaks"], BreathMetrics(self.y, 100).breaths["peaks"]
+        )
+
+    def test__scoped_to_context(self):
+        self.assertIsNone(current_collector())
+
+        with collect() as outer:
+            with collect() as inner:
+                mean_smooth(self.y, 100)
+            mean_smooth(self.y, 100)
+
+            # Threads do not inherit the collector
+            thread = threading.Thread(target=mean_smooth, args=(self.y, 100))
+            thread.start()
+            thread.join()
+
+        self.assertEqual(inner.stats["preprocess.mean_smooth"]["calls"], 1)
+        self.assertEqual(outer.stats["preprocess.mean_smooth"]["calls"], 1)
+        self.assertIsNone(current_collector())
+
+    def test__allocated_bytes(self):
+        # Each call raises the traced peak, so the bytes are exact whether or not
+        # the peak can be reset between calls
+        records = []
+        with collect(records.append, track_memory=True):
+            allocate(1_000_000)
+            allocate(2_000_000, inner=4_000_000)
+
+        first, inner, outer = [record.allocated_bytes for record in records]
+        self.assertGreaterEqual(first, 1_000_000)
+        self.assertLess(first, 1_500_000)
+        self.assertGreaterEqual(inner, 4_000_000)
+        self.assertGreaterEqual(outer, 6_000_000)
+
+        # Memory is not tracked by default
+        with collect(records.append):
+            allocate(100)
+        self.assertIsNone(records[-1].allocated_bytes)
+
+    def test__keeps_other_tracer_peak(self):
+        tracemalloc.start()
+        try:
+            allocate(8_000_000)
+            records = []
+            with collect(records.append, track_memory=True):
+                allocate(1_000_000)
+            self.assertGreaterEqual(tracemalloc.get_traced_memory()[1], 8_000_000)
+            self.assertTrue(tracemalloc.is_tracing())
+        finally:
+            tracemalloc.stop()
+
+        # The call did not raise the peak, and reports at least what it kept
+        self.assertGreaterEqual(records[0].allocated_bytes, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,145 @@
+import unittest
+from unittest import mock
+import numpy as np
+from numpy.testing import assert_allclose, assert_array_equal
+from pipeline import BreathMetrics, process_signals
+from preprocess import mean_smooth, remove_global_drift, z_score
+from extrema_detection import find_potential_extrema, pwct, find_corrected_extrema
+from onset_offset_detection import MISSING, find_onsets
+from .test_findOnsetOffset import breathing_signal
+
+
+class TestBreathMetrics(unittest.TestCase):
+    def setUp(self):
+        self.y = breathing_signal(30, 200, 0)
+        self.y += np.linspace(0, 2, self.y.shape[0])
+        self.bm = BreathMetrics(self.y, 200)
+
+    def test__matches_manual_chain(self):
+        detrended = remove_global_drift(mean_smooth(self.y, 200, mode="same"))
+        normalized = z_score(detrended)
+        peaks, troughs = find_corrected_extrema(
+            normalized, *pwct(*find_potential_extrema(normalized, 200))
+        )
+
+        assert_array_equal(self.bm.extrema[0], peaks)
+        assert_array_equal(self.bm.extrema[1], troughs)
+        for actual, expected in zip(
+            self.bm.onsets, find_onsets(normalized, peaks, troughs)
+        ):
+            assert_array_equal(actual, expected)
+
+        metrics = self.bm.metrics
+        assert_allclose(metrics["breathing_rate"], 1 / metrics["interbreath_interval"])
+
+    def test__stages_computed_once(self):
+        with mock.patch(
+            "pipeline._pipeline.find_potential_extrema",
+            wraps=find_potential_extrema,
+        ) as potential_extrema:
+            self.bm.metrics
+            self.bm.breaths
+            self.bm.extrema
+            self.assertEqual(potential_extrema.call_count, 1)
+
+    def test__set_params_invalidates_downstream(self):
+        self.bm.metrics
+        normalized = self.bm.normalized
+
+        self.bm.set_params(shift=2)
+        self.assertIs(self.bm.normalized, normalized)
+        self.assertNotIn("extrema", self.bm._cache)
+        self.assertNotIn("metrics", self.bm._cache)
+
+        # Unchanged values keep the cache
+        self.bm.metrics
+        self.bm.set_params(shift=2, drift_order=1)
+        self.assertIn("metrics", self.bm._cache)
+
+        with self.assertRaises(ValueError):
+            self.bm.set_params(window=3)
+
+    def test__float32_close_to_float64(self):
+        bm = BreathMetrics(self.y, 200, dtype=np.float32)
+        self.assertEqual(bm.normalized.dtype, np.float32)
+
+        # Extrema may move by a few samples where values are nearly tied
+        peaks, expected = bm.extrema[0], self.bm.extrema[0]
+        self.assertEqual(peaks.shape, expected.shape)
+        self.assertLessEqual(np.abs(peaks - expected).max(), 2)
+
+        for name in ("inhale_offsets", "exhale_offsets", "inhale_pause_onsets"):
+            self.assertEqual(bm.breaths[name].dtype, np.int64)
+        self.assertEqual(bm.breaths["exhale_offsets"][-1], MISSING)
+
+        for name, value in self.bm.metrics.items():
+            assert_allclose(bm.metrics[name], value, rtol=1e-3, err_msg=name)
+
+    def test__decimated(self):
+        y = breathing_signal(30, 1000, 1)
+        bm = BreathMetrics(y, 1000, decimate_sr=50)
+        self.assertEqual(bm.factor, 20)
+        self.assertEqual(bm.detection_sr, 50)
+        self.assertEqual(bm.normalized.shape, (-(-y.shape[0] // 20),))
+
+        # Breaths are found at 50 Hz close to where they are found at 1000 Hz,
+        # as samples of y
+        full_rate = BreathMetrics(y, 1000).breaths
+        self.assertEqual(bm.breaths.sr, 1000)
+        self.assertLessEqual(abs(len(bm.breaths) - len(full_rate)), 2)
+        for field in ["peaks", "troughs", "inhale_onsets", "exhale_onsets"]:
+            distances = np.abs(np.subtract.outer(bm.breaths[field], full_rate[field]))
+            self.assertLess(np.median(distances.min(axis=1)), 100)
+
+        # Refined extrema are the extrema of y around the decimated ones
+        refined = bm.breaths
+        unrefined = bm.set_params(refine_extrema=False).breaths
+        for peak, unrefined_peak in zip(refined["peaks"], unrefined["peaks"]):
+            self.assertEqual(unrefined_peak % 20, 0)
+            window = y[max(unrefined_peak - 20, 0) : unrefined_peak + 21]
+            self.assertEqual(y[peak], window.max())
+
+
+class TestProcessSignals(unittest.TestCase):
+    def test__matches_single_signal_pipeline(self):
+        signals = [breathing_signal(20, 200, seed) for seed in range(3)]
+        length = min(signal.shape[0] for signal in signals)
+
+        # Equal lengths as a 2-D array, and ragged lengths as a list
+        for batch in [np.stack([s[:length] for s in signals]), signals]:
+            for n_workers in [1, 2]:
+                breaths, metrics = process_signals(batch, 200, n_workers)
+
+                for i, signal in enumerate(batch):
+                    bm = BreathMetrics(signal, 200)
+                    signal_breaths = breaths[breaths["signal"] == i]
+
+                    for field, values in bm.breaths.to_dict().items():
+                        assert_allclose(signal_breaths[field], values)
+                    for field, value in bm.metrics.items():
+                        assert_allclose(metrics[field][i], value)
+
+    def test__no_signals(self):
+        for signals in [[], np.empty((0, 100))]:
+            breaths, metrics = process_signals(signals, 200, 1)
+            self.assertEqual(breaths.shape, (0,))
+            self.assertIn("peaks", breaths.dtype.names)
+            self.assertEqual(metrics.shape, (0,))
+            self.assertIn("breathing_rate", metrics.dtype.names)
+
+    def test__decimated(self):
+        signals = [breathing_signal(20, 1000, seed) for seed in range(2)]
+        breaths, metrics = process_signals(signals, 1000, 1, decimate_sr=100)
+
+        for i, signal in enumerate(signals):
+            bm = BreathMetrics(signal, 1000, decimate_sr=100)
+            signal_breaths = breaths[breaths["signal"] == i]
+
+            for field, values in bm.breaths.to_dict().items():
+                assert_allclose(signal_breaths[field], values)
+            for field, value in bm.metrics.items():
+                assert_allclose(metrics[field][i], value)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,184 @@
+import unittest
+import numpy as np
+from numpy.testing import assert_allclose, assert_array_equal
+from preprocess import (
+    mean_smooth,
+    remove_global_drift,
+    remove_local_drift,
+    decimation_factor,
+    decimate,
+    to_full_rate,
+    refine_extrema,
+)
+from preprocess._preprocess import find_global_drift, find_local_drift
+
+
+def loop_mean_smooth(y, sr, window_ms=25):
+    window_samples = int(sr / 1000 * window_ms)
+
+    y_padded = np.hstack(
+        (np.zeros((window_samples - 1,)), y, np.zeros((window_samples,)))
+    )
+
+    smoothed = np.zeros((y_padded.shape[0] - window_samples,))
+
+    for i in range(y_padded.shape[0] - window_samples):
+        if i < window_samples - 1:
+            smoothed[i] = y_padded[i : i + window_samples].sum() / (i + 1)
+        elif i > y_padded.shape[0] - 2 * window_samples:
+            smoothed[i] = y_padded[i : i + window_samples].sum() / (
+                y_padded.shape[0] - window_samples - i
+            )
+        else:
+            smoothed[i] = y_padded[i : i + window_samples].mean()
+
+    return smoothed
+
+
+class TestMeanSmooth(unittest.TestCase):
+    def test__matches_loop_implementation(self):
+        rng = np.random.default_rng(0)
+        y = np.sin(np.linspace(0, 20 * np.pi, 3000)) + rng.normal(0, 0.1, 3000)
+
+        for sr in [200, 500, 1000]:
+            assert_allclose(mean_smooth(y, sr), loop_mean_smooth(y, sr), atol=1e-12)
+
+        assert_allclose(
+            mean_smooth(y, 1000, window_ms=40),
+            loop_mean_smooth(y, 1000, 40),
+            atol=1e-12,
+        )
+
+    def test__crosses_blocks(self):
+        rng = np.random.default_rng(1)
+        y = rng.normal(0, 1, 150_000)
+
+        assert_allclose(mean_smooth(y, 1000), loop_mean_smooth(y, 1000), atol=1e-12)
+
+    def test__same_mode(self):
+        y = np.random.default_rng(5).normal(0, 1, 1000)
+
+        for sr in [200, 240]:
+            full = loop_mean_smooth(y, sr)
+            offset = (int(sr / 1000 * 25) - 1) // 2
+            assert_allclose(
+                mean_smooth(y, sr, mode="same"), full[offset : offset + 1000]
+            )
+
+    def test__along_axis(self):
+        y = np.random.default_rng(6).normal(0, 1, (3, 500))
+
+        smoothed = mean_smooth(y.T, 200, mode="same", axis=0)
+        for channel in range(3):
+            assert_allclose(
+                smoothed[:, channel], mean_smooth(y[channel], 200, mode="same")
+            )
+
+    def test__out_buffer(self):
+        y = np.arange(100, dtype=float)
+        out = np.empty((104,))
+        smoothed = mean_smooth(y, 200, out=out)
+
+        self.assertIs(smoothed, out)
+        assert_allclose(out, loop_mean_smooth(y, 200))
+
+        with self.assertRaises(ValueError):
+            mean_smooth(y, 200, out=np.empty((100,)))
+
+
+class TestGlobalDrift(unittest.TestCase):
+    def test__matches_polyfit(self):
+        rng = np.random.default_rng(2)
+        x = np.arange(200_000)
+        y = 3e-5 * x + 2 + rng.normal(0, 1, x.shape[0])
+
+        for order in [1, 3]:
+            expected = np.polyval(np.polyfit(x, y, order), x)
+            assert_allclose(find_global_drift(y, order), expected, atol=1e-9)
+            assert_allclose(
+                remove_global_drift(y, order), y - expected, rtol=1e-9, atol=1e-9
+            )
+
+    def test__along_axis(self):
+        rng = np.random.default_rng(3)
+        y = rng.normal(0, 1, (3, 1000)) + np.arange(1000) * np.array([[1], [-2], [0]])
+
+        detrended = remove_global_drift(y)
+        for channel in range(3):
+            assert_allclose(detrended[channel], remove_global_drift(y[channel]))
+        assert_allclose(remove_global_drift(y.T, axis=0), detrended.T)
+
+    def test__in_place(self):
+        y = np.arange(1000, dtype=float) * 0.5 + 3
+        detrended = remove_global_drift(y, out=y)
+
+        self.assertIs(detrended, y)
+        assert_allclose(y, 0, atol=1e-9)
+
+
+class TestLocalDrift(unittest.TestCase):
+    def test__matches_direct_convolution(self):
+        rng = np.random.default_rng(4)
+        y = rng.normal(0, 1, 5000)
+        w_size = 500
+
+        # "same" mode leans right for even windows, so the second pass is
+        # flipped to lean left
+        counts = np.convolve(np.ones(y.shape), np.ones(w_size), "same")
+        expected = np.convolve(y, np.ones(w_size), "same") / counts
+        expected = np.convolve(expected[::-1], np.ones(w_size), "same")[::-1]
+        expected /= counts[::-1]
+
+        local_drift = find_local_drift(y, 100, 5)
+        self.assertEqual(local_drift.dtype, np.float64)
+        assert_allclose(local_drift, expected, atol=1e-12)
+        assert_allclose(find_local_drift(y, 100, 5, workers=2), local_drift)
+
+    def test__no_wrap_around(self):
+        y = np.linspace(0, 10, 10_000)
+        local_drift = find_local_drift(y, 100, 10)
+
+        # A ramp is left untouched wherever the window fits in the signal
+        assert_allclose(local_drift[1000:-1000], y[1000:-1000], atol=1e-9)
+        self.assertLess(local_drift[0], 1)
+        self.assertGreater(local_drift[-1], 9)
+
+        assert_allclose(remove_local_drift(y, 100, 10), y - local_drift)
+
+
+class TestDecimate(unittest.TestCase):
+    def test__aligned_and_anti_aliased(self):
+        t = np.arange(20000) / 1000
+        breathing = np.sin(2 * np.pi * 0.3 * t) + t / 10
+
+        # Samples line up with every 20th sample of the signal
+        decimated = decimate(breathing, 20)
+        self.assertEqual(decimated.shape, (1000,))
+        assert_allclose(decimated, breathing[::20], atol=5e-3)
+
+        # A 40 Hz tone is above the Nyquist frequency of 50 Hz and would alias
+        # onto a 10 Hz one without the low-pass filter
+        tone = np.sin(2 * np.pi * 40 * t + 0.5)
+        self.assertGreater(tone[::20].std(), 0.3)
+        self.assertLess(decimate(tone, 20)[50:-50].std(), 0.01)
+
+        self.assertEqual(decimate(breathing, 1, dtype=np.float32).dtype, np.float32)
+        assert_array_equal(decimate(breathing, 1), breathing)
+
+    def test__decimation_factor(self):
+        self.assertEqual(decimation_factor(1000, None), 1)
+        self.assertEqual(decimation_factor(1000, 50), 20)
+        self.assertEqual(decimation_factor(1000, 30), 33)
+        self.assertEqual(decimation_factor(100, 200), 1)
+
+    def test__full_rate_indices(self):
+        assert_array_equal(to_full_rate([0, 3, -1, 12], 10, 95), [0, 30, -1, 94])
+
+        y = np.zeros(100)
+        y[[2, 38, 41, 97]] = [1, -1, 2, 3]
+        assert_array_equal(refine_extrema(y, [0, 40, 99], 5), [2, 41, 97])
+        assert_array_equal(refine_extrema(y, [40], 5, find_max=False), [38])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,42 @@
+import unittest
+import numpy as np
+from numpy.testing import assert_allclose, assert_array_equal
+from metrics import find_rolling_metrics, summarize
+from pipeline import BreathMetrics
+from .test_findOnsetOffset import breathing_signal
+
+
+class TestRollingMetrics(unittest.TestCase):
+    def setUp(self):
+        self.breaths = BreathMetrics(breathing_signal(100, 100, 0), 100).breaths
+
+    def test__matches_metrics_per_window(self):
+        rolling = find_rolling_metrics(self.breaths, window=30, hop=5)
+
+        self.assertGreater(rolling.shape[0], 50)
+        assert_array_equal(np.diff(rolling["start"]), 5)
+        for window in rolling:
+            breaths = self.breaths.between(window["start"], window["start"] + 30)
+            self.assertEqual(window["n_breaths"], len(breaths))
+
+            for name, value in summarize(breaths)._asdict().items():
+                assert_allclose(window[name], value, rtol=1e-9, err_msg=name)
+
+    def test__whole_recording(self):
+        stop = (self.breaths["inhale_onsets"][-1] + 1) / 100
+        (rolling,) = find_rolling_metrics(self.breaths, window=stop, hop=1)
+
+        self.assertEqual(rolling["n_breaths"], len(self.breaths))
+        for name, value in summarize(self.breaths)._asdict().items():
+            assert_allclose(rolling[name], value, rtol=1e-9, err_msg=name)
+
+    def test__empty_windows(self):
+        rolling = find_rolling_metrics(self.breaths, window=2, hop=1, stop=100)
+
+        empty = rolling["n_breaths"] == 0
+        self.assertTrue(empty.any())
+        self.assertTrue(np.isnan(rolling["breathing_rate"][empty]).all())
+
+
+if __name__ == "__main__":
+    unittest.main()
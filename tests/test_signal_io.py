@@ -0,0 +1,82 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from numpy.testing import assert_allclose, assert_array_equal
+from signal_io import load_signal, scratch_array
+from pipeline import process_chunked
+from preprocess import remove_local_drift
+from preprocess._preprocess import find_local_drift
+from .test_findOnsetOffset import breathing_signal
+
+
+class TestSignalIO(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.y = breathing_signal(40, 100, 0)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.tmp_dir.name, name)
+
+    def test__load_signal(self):
+        np.save(self.path("y.npy"), self.y)
+        self.y.astype(np.float32).tofile(self.path("y.raw"))
+
+        y = load_signal(self.path("y.npy"))
+        self.assertIsInstance(y, np.memmap)
+        assert_array_equal(y, self.y)
+
+        y = load_signal(self.path("y.raw"), np.float32, offset=40)
+        assert_array_equal(y, self.y[10:].astype(np.float32))
+
+        with self.assertRaises(ValueError):
+            load_signal(self.path("y.raw"))
+
+    def test__scratch_array(self):
+        scratch = scratch_array((100,))
+        scratch[:] = np.arange(100)
+        self.assertIsInstance(scratch, np.memmap)
+
+        scratch = scratch_array((100,), path=self.path("scratch.npy"))
+        scratch[:] = np.arange(100)
+        scratch.flush()
+        assert_array_equal(np.load(self.path("scratch.npy")), np.arange(100))
+
+    def test__process_chunked_from_disk(self):
+        np.save(self.path("y.npy"), self.y)
+        expected, _ = process_chunked(self.y, 100, 1000)
+
+        for scratch in [None, True, self.path("detrended.npy")]:
+            breaths, _ = process_chunked(self.path("y.npy"), 100, 1000, scratch=scratch)
+
+            assert_array_equal(breaths["peaks"], expected["peaks"])
+            assert_array_equal(breaths["exhale_onsets"], expected["exhale_onsets"])
+            assert_allclose(breaths["inhale_volumes"], expected["inhale_volumes"])
+
+        self.assertEqual(np.load(self.path("detrended.npy")).shape, self.y.shape)
+
+    def test__local_drift_blocks(self):
+        # Spans several blocks
+        y = np.random.default_rng(1).normal(0, 1, 200_000)
+        np.save(self.path("y.npy"), y)
+
+        # Memory-mapped inputs are read block by block instead of through the FFT
+        for period in [10, 15.05, 1000]:
+            expected = find_local_drift(y, 100, period)
+            assert_allclose(
+                find_local_drift(load_signal(self.path("y.npy")), 100, period),
+                expected,
+                atol=1e-9,
+            )
+
+            out = scratch_array(y.shape)
+            assert_allclose(
+                remove_local_drift(y, 100, period, out=out), y - expected, atol=1e-9
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
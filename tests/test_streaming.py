@@ -0,0 +1,92 @@
+import unittest
+import numpy as np
+from numpy.testing import assert_array_equal
+from metrics import BREATH_DTYPE
+from onset_offset_detection import MISSING
+from pipeline import BreathMetrics, StreamingBreathDetector
+from pipeline._streaming import _History
+from .test_findOnsetOffset import breathing_signal
+
+
+class TestStreamingBreathDetector(unittest.TestCase):
+    def setUp(self):
+        self.y = breathing_signal(150, 100, 0)
+        self.y += np.linspace(0, 3, self.y.shape[0])
+
+    def test__independent_of_chunking(self):
+        expected = StreamingBreathDetector(100, period=30).push(self.y)
+
+        rng = np.random.default_rng(1)
+        detector = StreamingBreathDetector(100, period=30)
+        bounds = np.cumsum(rng.integers(1, 700, self.y.shape[0] // 100))
+        actual = np.concatenate(
+            [detector.push(chunk) for chunk in np.split(self.y, bounds)]
+        )
+
+        self.assertGreater(expected.shape[0], 100)
+        for field in expected.dtype.names:
+            assert_array_equal(actual[field], expected[field])
+
+    def test__close_to_batch_detection(self):
+        breaths = StreamingBreathDetector(100, period=30).push(self.y)
+        peaks = BreathMetrics(self.y, 100).extrema[0]
+
+        # Within 200 ms of a peak found on the whole recording
+        distances = np.abs(breaths["peaks"][:, None] - peaks[None]).min(axis=1)
+        self.assertGreater((distances <= 20).mean(), 0.9)
+
+        self.assertTrue((breaths["inhale_onsets"] < breaths["peaks"]).all())
+        self.assertTrue((breaths["peaks"] < breaths["troughs"]).all())
+        self.assertTrue((breaths["inhale_volumes"] > 0).all())
+
+    def test__bounded_memory(self):
+        detector = StreamingBreathDetector(100, period=30)
+        buffer_size = detector._normalized._buffer.shape[0]
+
+        for chunk in np.array_split(self.y, 50):
+            detector.push(chunk)
+
+            self.assertEqual(detector._normalized._buffer.shape[0], buffer_size)
+            self.assertLess(detector._pending.shape[0], detector._piece_size)
+            self.assertTrue((detector._peaks >= detector._normalized.start).all())
+
+    def test__gap_longer_than_history(self):
+        # 80 s of a disconnected sensor, past the 30 s period of the history
+        gap_start, gap_stop = 8000, 16000
+        y = breathing_signal(60, 100, 0)
+        y = np.concatenate((y[:gap_start], np.zeros(8000), y[gap_start:]))
+        detector = StreamingBreathDetector(100, period=30)
+
+        breaths = np.concatenate(
+            [detector.push(chunk) for chunk in np.array_split(y, 40)]
+        )
+
+        self.assertTrue((breaths["peaks"] < gap_start).any())
+        self.assertTrue((breaths["peaks"] > gap_stop).any())
+        self.assertTrue((np.diff(breaths["peaks"]) > 0).all())
+
+        # The breath waiting for its next inhale when its samples left the
+        # history is emitted without its exhale offset
+        expired = breaths[breaths["exhale_offsets"] == MISSING]
+        self.assertEqual(len(expired), 1)
+        self.assertLess(expired["peaks"][0], gap_stop)
+        self.assertTrue(np.isnan(expired["inhale_volumes"][0]))
+        self.assertTrue(np.isnan(expired["exhale_durations"][0]))
+
+    def test__history(self):
+        history = _History(10)
+        for start in range(0, 50, 7):
+            history.extend(np.arange(start, start + 7, dtype=float))
+
+        # Samples are addressed by absolute index, and hold their index here
+        self.assertEqual(history.stop, 56)
+        assert_array_equal(history.get(46, 56), np.arange(46, 56))
+        with self.assertRaises(ValueError):
+            history.get(history.start - 1, history.stop)
+
+        detector = StreamingBreathDetector(100)
+        self.assertEqual(detector.push(self.y).dtype, BREATH_DTYPE)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+import numpy as np
+from numpy.testing import assert_allclose
+from metrics import (
+    MetricsSummary,
+    summarize,
+    find_interbreath_interval,
+    find_breathing_rate,
+    find_tidal_volume,
+    find_minute_ventilation,
+    find_duty_cycle,
+    find_coef_var_breathing_rate,
+    find_coef_var_breath_volumes,
+    find_coef_var_duty_cycle,
+)
+from pipeline import BreathMetrics
+from .test_findOnsetOffset import breathing_signal
+
+
+class TestSummarize(unittest.TestCase):
+    def test__matches_metric_functions(self):
+        breaths = BreathMetrics(breathing_signal(60, 100, 0), 100).breaths
+        onsets = breaths["inhale_onsets"]
+        offsets = breaths["inhale_offsets"]
+        inhale_volumes = breaths["inhale_volumes"]
+        exhale_volumes = breaths["exhale_volumes"]
+
+        interbreath_interval = find_interbreath_interval(100, onsets)
+        breathing_rate = find_breathing_rate(100, onsets)
+        tidal_volume = find_tidal_volume(inhale_volumes, exhale_volumes)
+        expected = MetricsSummary(
+            breathing_rate=breathing_rate,
+            interbreath_interval=interbreath_interval,
+            coef_var_breathing_rate=find_coef_var_breathing_rate(100, onsets),
+            tidal_volume=tidal_volume,
+            minute_ventilation=find_minute_ventilation(breathing_rate, tidal_volume),
+            duty_cycle=find_duty_cycle(100, onsets, offsets, interbreath_interval),
+            coef_var_duty_cycle=find_coef_var_duty_cycle(100, onsets, offsets),
+            coef_var_breath_volumes=find_coef_var_breath_volumes(inhale_volumes),
+        )
+
+        summary = summarize(breaths)
+        self.assertIsInstance(summary, MetricsSummary)
+        for name, value in expected._asdict().items():
+            assert_allclose(getattr(summary, name), value, rtol=1e-9, err_msg=name)
+
+    def test__too_few_breaths(self):
+        breaths = BreathMetrics(breathing_signal(60, 100, 0), 100).breaths[:1]
+        summary = summarize(breaths)
+
+        self.assertTrue(np.isnan(summary.breathing_rate))
+        self.assertFalse(np.isnan(summary.tidal_volume))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+import numpy as np
+from numpy.testing import assert_array_equal
+from extrema_detection import (
+    ExtremaSweep,
+    sweep_votes,
+    find_potential_extrema,
+    count_votes,
+    pwct,
+    select_extrema,
+)
+from .test_findOnsetOffset import breathing_signal
+
+
+class TestExtremaSweep(unittest.TestCase):
+    def setUp(self):
+        self.y = breathing_signal(20, 100, 0)
+
+    def test__matches_potential_extrema(self):
+        # Rounding creates ties, which resolve to the first index
+        for y in [self.y, np.round(self.y, 1)]:
+            sweep = ExtremaSweep(y, 100, [130, 300, 500, 700, 1000, 5000])
+
+            for window_sizes_ms in [[300, 500, 700, 1000, 5000], [130, 500]]:
+                for shift in [1, 2, 3, 5]:
+                    peaks, troughs = sweep.potential_extrema(window_sizes_ms, shift)
+                    expected = find_potential_extrema(y, 100, window_sizes_ms, shift)
+
+                    for actual, expected_w in zip(peaks, expected[0]):
+                        assert_array_equal(actual, expected_w)
+                    for actual, expected_w in zip(troughs, expected[1]):
+                        assert_array_equal(actual, expected_w)
+
+    def test__windows_longer_than_signal(self):
+        y = self.y[:300]
+        sweep = ExtremaSweep(y, 100, [1000, 5000])
+
+        expected = find_potential_extrema(y, 100, [1000, 5000], 3)
+        actual = sweep.potential_extrema([1000, 5000], 3)
+        for actual_w, expected_w in zip(
+            actual[0] + actual[1], expected[0] + expected[1]
+        ):
+            assert_array_equal(actual_w, expected_w)
+
+        with self.assertRaises(ValueError):
+            ExtremaSweep(self.y, 100, [300]).potential_extrema([5000], 3)
+
+    def test__sweep_votes(self):
+        configs = [([300, 500, 700, 1000, 5000], 3), ([300, 1000], 2), ((500,), 4)]
+        tables = sweep_votes(self.y, 100, configs)
+
+        self.assertEqual(len(tables), 3)
+        for window_sizes_ms, shift in configs:
+            table = tables[tuple(window_sizes_ms), shift]
+            potential_extrema = find_potential_extrema(
+                self.y, 100, window_sizes_ms, shift
+            )
+            for actual, expected in zip(table, count_votes(*potential_extrema)):
+                assert_array_equal(actual, expected)
+
+            for actual, expected in zip(
+                select_extrema(*table, window_sizes_ms, shift),
+                pwct(*potential_extrema, window_sizes_ms, shift),
+            ):
+                assert_array_equal(actual, expected)
+
+
+if __name__ == "__main__":
+    unittest.main()